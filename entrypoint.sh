@@ -3,6 +3,7 @@
 set -e
 
 SETUP_FLAG_FILE="/app/source/.setup_complete"
+ROLLUPS_FLAG_FILE="/app/source/.rollups_built"
 
 # Wait for the database to be ready
 if [ "$DATABASE" = "postgres" ]; then
@@ -24,6 +25,7 @@ if [ ! -f "$SETUP_FLAG_FILE" ]; then
     # Load initial data from fixture files.
     # Replace with your actual fixture file names.
     python manage.py loaddata fixtures.json
+    python manage.py backfill_order_totals
 
     echo "Initial setup complete. Creating flag file."
     touch "$SETUP_FLAG_FILE"
@@ -31,4 +33,12 @@ else
     echo "Setup has already been completed. Skipping fixture loading."
 fi
 
+# Fill the daily sales rollups once; afterwards every order change keeps its
+# days up to date. Databases set up before the rollups existed need this too.
+if [ ! -f "$ROLLUPS_FLAG_FILE" ]; then
+    echo "Building the daily sales rollups..."
+    python manage.py rebuild_sales_rollups
+    touch "$ROLLUPS_FLAG_FILE"
+fi
+
 exec "$@"
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from shop_analytics.search import SearchAdminMixin
 from .models import Product, Order, OrderProduct
 
 
@@ -16,11 +17,11 @@ class OrderProductInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(SearchAdminMixin, admin.ModelAdmin):
     inlines = [OrderProductInline]
     list_display = ("id", "user", "status", "created_at", "total_amount")
     list_filter = ("status", "apply_vat", "created_at")
-    search_fields = ("id", "user__email", "user__first_name", "user__last_name")
+    search_fields = ("user__email", "user__full_name")
     readonly_fields = ("created_at", "total_amount")
     fieldsets = (
         ("Order Information", {"fields": ("user", "status", "created_at")}),
@@ -30,13 +31,19 @@ class OrderAdmin(admin.ModelAdmin):
         ),
     )
 
-    @admin.display(description="Total (KZT)")
+    def get_search_results(self, request, queryset, search_term):
+        # Order numbers are matched exactly, so the primary key index is used.
+        if search_term.strip().isdigit():
+            return queryset.filter(pk=search_term.strip()), False
+        return super().get_search_results(request, queryset, search_term)
+
+    @admin.display(description="Total (KZT)", ordering="total")
     def total_amount(self, obj):
-        return obj.calculate_total()
+        return obj.total
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(SearchAdminMixin, admin.ModelAdmin):
     list_display = ("name", "price", "stock_quantity", "is_active", "user")
     list_editable = ("price", "stock_quantity", "is_active")
     list_filter = ("is_active", "user")
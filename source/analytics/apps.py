@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class AnalyticsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "analytics"
+
+    def ready(self):
+        from shop_analytics.db_router import check_pin_cache
+
+        from . import signals  # noqa: F401
+
+        checks.register(check_pin_cache, checks.Tags.caches)
@@ -0,0 +1,158 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Order, OrderProduct, Product
+
+User = get_user_model()
+
+
+class ImportLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class ImportOrderSerializer(serializers.Serializer):
+    user = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(
+        choices=Order.StatusChoices.choices, default=Order.StatusChoices.DRAFT
+    )
+    apply_vat = serializers.BooleanField(default=False)
+    delivery_cost = serializers.DecimalField(
+        max_digits=10, decimal_places=2, default=200
+    )
+    created_at = serializers.DateTimeField(required=False)
+    products = ImportLineSerializer(many=True, allow_empty=False)
+
+
+def _parse(line_number, line):
+    try:
+        data = json.loads(line)
+    except ValueError as exc:
+        return None, {"line": line_number, "errors": {"json": [str(exc)]}}
+    serializer = ImportOrderSerializer(data=data)
+    if not serializer.is_valid():
+        return None, {"line": line_number, "errors": serializer.errors}
+    return serializer.validated_data, None
+
+
+def _import_chunk(rows):
+    """Insert a chunk of validated rows, returning ``(imported, errors)``.
+
+    Users and products referenced by the chunk are resolved with one query
+    each; orders and lines are written with bulk inserts in one transaction.
+    """
+    user_ids = set(
+        User.objects.filter(pk__in={row["user"] for _, row in rows}).values_list(
+            "pk", flat=True
+        )
+    )
+    product_ids = set(
+        Product.objects.filter(
+            pk__in={line["product"] for _, row in rows for line in row["products"]}
+        ).values_list("pk", flat=True)
+    )
+
+    errors, valid = [], []
+    for line_number, row in rows:
+        missing = [
+            line["product"]
+            for line in row["products"]
+            if line["product"] not in product_ids
+        ]
+        if row["user"] not in user_ids:
+            errors.append({"line": line_number, "errors": {"user": ["Not found."]}})
+        elif missing:
+            errors.append(
+                {
+                    "line": line_number,
+                    "errors": {"products": [f"Products not found: {missing}."]},
+                }
+            )
+        else:
+            valid.append(row)
+    if not valid:
+        return 0, errors
+
+    with transaction.atomic():
+        orders = Order.objects.bulk_create(
+            Order(
+                user_id=row["user"],
+                status=row["status"],
+                apply_vat=row["apply_vat"],
+                delivery_cost=row["delivery_cost"],
+            )
+            for row in valid
+        )
+        OrderProduct.objects.bulk_create(
+            OrderProduct(
+                order=order, product_id=line["product"], quantity=line["quantity"]
+            )
+            for order, row in zip(orders, valid)
+            for line in row["products"]
+        )
+        backdated = []
+        for order, row in zip(orders, valid):
+            if "created_at" in row:
+                order.created_at = row["created_at"]
+                backdated.append(order)
+        if backdated:
+            Order.objects.bulk_update(backdated, ["created_at"])
+        Order.objects.filter(pk__in=[order.pk for order in orders]).refresh_totals()
+    return len(orders), errors
+
+
+def import_orders(lines, chunk_size=500):
+    """Import NDJSON orders from an iterable of lines, one order per line.
+
+    Rows are validated and inserted in chunks of ``chunk_size`` so memory stays
+    flat regardless of input size. Yields an ``error`` event for every rejected
+    row and a ``progress`` event after every chunk; invalid rows never abort
+    the import. Imported orders keep their status as-is and do not reserve
+    stock, since they describe sales that already happened.
+    """
+    processed = imported = failed = reported = 0
+    chunk = []
+
+    def flush():
+        nonlocal imported, failed
+        chunk_imported, chunk_errors = _import_chunk(chunk)
+        imported += chunk_imported
+        failed += len(chunk_errors)
+        chunk.clear()
+        return chunk_errors
+
+    def progress():
+        nonlocal reported
+        reported = processed
+        return {
+            "type": "progress",
+            "processed": processed,
+            "imported": imported,
+            "failed": failed,
+        }
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        processed += 1
+        row, error = _parse(line_number, line)
+        if error:
+            failed += 1
+            yield {"type": "error", **error}
+            continue
+        chunk.append((line_number, row))
+        if len(chunk) >= chunk_size:
+            for error in flush():
+                yield {"type": "error", **error}
+            yield progress()
+
+    if chunk:
+        for error in flush():
+            yield {"type": "error", **error}
+    if reported != processed or not processed:
+        yield progress()
@@ -0,0 +1,185 @@
+"""Helpers of the ``benchmark_*`` commands, which load a local gunicorn server."""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+HEADER = f"{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}"
+
+
+def add_load_arguments(parser, requests=1000, concurrency=4):
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=requests,
+        help=f"Measured requests per run (default: {requests}).",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=50,
+        help="Unmeasured requests sent before each run (default: 50).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=concurrency,
+        help=f"Requests in flight at once (default: {concurrency}).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="gunicorn worker processes (default: 2).",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--email",
+        help="User the requests authenticate as (default: the first staff user).",
+    )
+
+
+def benchmark_user(email=None):
+    """Return the active user ``email``, or the first active staff user."""
+    users = User.objects.filter(is_active=True)
+    if email:
+        user = users.filter(email=email).first()
+    else:
+        user = users.filter(is_staff=True).order_by("pk").first()
+    if user is None:
+        raise CommandError("No active user to authenticate as.")
+    return user
+
+
+def auth_headers(email=None):
+    """Return headers authenticating as ``email``, or as the first staff user."""
+    user = benchmark_user(email)
+    return {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+
+def serve(application, url, headers, options, env=None, worker_class=None):
+    """Start gunicorn serving ``application`` and return a ``Server`` for it.
+
+    ``env`` is added to the environment of the server, ``worker_class`` is
+    passed on as ``--worker-class``.
+    """
+    with socket.socket() as probe:
+        if probe.connect_ex(("127.0.0.1", options["port"])) == 0:
+            raise CommandError(f"Port {options['port']} is already in use.")
+
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        application,
+        "--bind",
+        f"127.0.0.1:{options['port']}",
+        "--workers",
+        str(options["workers"]),
+        "--log-level",
+        "warning",
+    ]
+    if worker_class:
+        command += ["--worker-class", worker_class]
+    process = subprocess.Popen(
+        command, cwd=settings.BASE_DIR, env={**os.environ, **(env or {})}
+    )
+    return Server(process, url, headers)
+
+
+def measure(url, headers, options):
+    """Request ``url`` as ``options`` say; return the latencies and elapsed time."""
+    local = threading.local()
+
+    def get(_):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.get(url, headers=headers)
+        latency = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}.")
+        return latency
+
+    with ThreadPoolExecutor(options["concurrency"]) as executor:
+        list(executor.map(get, range(options["warmup"])))
+        started = time.perf_counter()
+        latencies = list(executor.map(get, range(options["requests"])))
+        return latencies, time.perf_counter() - started
+
+
+def measure_posts(url, headers, payloads, concurrency):
+    """POST every JSON payload to ``url`` with ``concurrency`` requests in flight.
+
+    Returns ``(latency, response)`` pairs in the order of ``payloads`` and the
+    elapsed time.
+    """
+    local = threading.local()
+
+    def post(payload):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.post(url, json=payload, headers=headers)
+        return time.perf_counter() - started, response
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(post, payloads))
+        return results, time.perf_counter() - started
+
+
+def format_row(latencies, elapsed):
+    """Format the columns of ``HEADER`` for one run."""
+    percentiles = statistics.quantiles(latencies, n=100)
+    return (
+        f"{percentiles[49] * 1000:>10.2f}"
+        f"{percentiles[98] * 1000:>10.2f}"
+        f"{statistics.fmean(latencies) * 1000:>10.2f}"
+        f"{len(latencies) / elapsed:>10.1f}"
+    )
+
+
+class Server:
+    """Context manager waiting for a gunicorn process to answer, then stopping it."""
+
+    def __init__(self, process, url, headers, timeout=30):
+        self.process = process
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError("gunicorn exited before serving requests.")
+            try:
+                requests.get(self.url, headers=self.headers, timeout=self.timeout)
+                return self
+            except requests.ConnectionError:
+                time.sleep(0.2)
+            except BaseException:
+                self.__exit__()
+                raise
+        self.__exit__()
+        raise CommandError("gunicorn did not start in time.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
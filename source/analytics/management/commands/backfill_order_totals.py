@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analytics.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored pricing columns of existing orders in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of orders recomputed per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="Resume from the first order with an id greater than this value.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = options["start_id"]
+        processed = 0
+
+        while True:
+            order_ids = list(
+                Order.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            with transaction.atomic():
+                processed += Order.objects.filter(pk__in=order_ids).refresh_totals(
+                    batch_size=batch_size
+                )
+            last_id = order_ids[-1]
+            self.stdout.write(f"Updated {processed} orders (last id {last_id}).")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {processed} orders."))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from analytics.management.benchmark import (
+    HEADER,
+    add_load_arguments,
+    auth_headers,
+    format_row,
+    measure,
+    serve,
+)
+
+SERVERS = (
+    ("WSGI", "shop_analytics.wsgi:application", None),
+    ("ASGI", "shop_analytics.asgi:application", "uvicorn_worker.UvicornWorker"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the API with gunicorn, once with sync WSGI workers and once with "
+        "uvicorn ASGI workers, and report request latency percentiles and "
+        "throughput of list and report endpoints under concurrent load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Endpoint to request, may be repeated (default: the product and "
+            "order lists and the customer ranking).",
+        )
+        add_load_arguments(parser, requests=500, concurrency=32)
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [
+            "/api/products/",
+            "/api/orders/",
+            "/api/report/sales/rankings",
+        ]
+        headers = auth_headers(options["email"])
+        base_url = f"http://127.0.0.1:{options['port']}"
+        width = max(len(path) for path in paths) + 8
+
+        self.stdout.write(
+            f"{options['requests']} requests per endpoint, "
+            f"{options['concurrency']} concurrent, {options['workers']} workers"
+        )
+        self.stdout.write(f"{'':<{width}}{HEADER}")
+        for label, application, worker_class in SERVERS:
+            with serve(
+                application,
+                base_url + paths[0],
+                headers,
+                options,
+                worker_class=worker_class,
+            ):
+                for path in paths:
+                    latencies, elapsed = measure(base_url + path, headers, options)
+                    self.stdout.write(
+                        f"{label + ' ' + path:<{width}}{format_row(latencies, elapsed)}"
+                    )
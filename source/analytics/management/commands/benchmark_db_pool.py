@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from analytics.management.benchmark import (
+    HEADER,
+    add_load_arguments,
+    auth_headers,
+    format_row,
+    measure,
+    serve,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the API with gunicorn, once without and once with the database "
+        "connection pool, and report request latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/api/products/",
+            help="Endpoint to request (default: /api/products/).",
+        )
+        add_load_arguments(parser)
+
+    def handle(self, *args, **options):
+        headers = auth_headers(options["email"])
+        url = f"http://127.0.0.1:{options['port']}{options['path']}"
+
+        self.stdout.write(
+            f"{options['requests']} requests to {options['path']}, "
+            f"{options['concurrency']} concurrent, {options['workers']} workers"
+        )
+        self.stdout.write(f"{'':<14}{HEADER}")
+        for label, pool in (("without pool", "false"), ("with pool", "true")):
+            env = {"DB_POOL": pool, "DB_CONN_MAX_AGE": "0"}
+            with serve("shop_analytics.wsgi:application", url, headers, options, env):
+                latencies, elapsed = measure(url, headers, options)
+            self.stdout.write(f"{label:<14}{format_row(latencies, elapsed)}")
@@ -0,0 +1,137 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analytics.management.benchmark import (
+    HEADER,
+    add_load_arguments,
+    auth_headers,
+    benchmark_user,
+    format_row,
+    measure_posts,
+    serve,
+)
+from analytics.models import Order, OrderProduct, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the API with gunicorn and confirm draft orders one request at a "
+        "time from many concurrent clients, every order taking stock of the same "
+        "few hot products. Reports confirmations per second, latency "
+        "percentiles and how many confirmations failed, and why."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=3,
+            help="Hot products every order draws from (default: 3).",
+        )
+        parser.add_argument(
+            "--lines",
+            type=int,
+            default=2,
+            help="Products per order, one unit each (default: 2).",
+        )
+        parser.add_argument(
+            "--stock",
+            type=int,
+            help="Initial stock of each hot product (default: enough for every "
+            "order; lower it to measure confirmations running out of stock).",
+        )
+        add_load_arguments(parser, requests=2000, concurrency=32)
+
+    def handle(self, *args, **options):
+        headers = auth_headers(options["email"])
+        url = f"http://127.0.0.1:{options['port']}/api/orders/bulk-transition/"
+        products, orders = self.create_orders(options)
+        order_ids = [order.pk for order in orders]
+        try:
+            with serve(
+                "shop_analytics.wsgi:application",
+                f"http://127.0.0.1:{options['port']}/api/products/",
+                headers,
+                options,
+            ):
+                warmup, measured = (
+                    order_ids[: options["warmup"]],
+                    order_ids[options["warmup"] :],
+                )
+                measure_posts(
+                    url, headers, self.payloads(warmup), options["concurrency"]
+                )
+                results, elapsed = measure_posts(
+                    url, headers, self.payloads(measured), options["concurrency"]
+                )
+        finally:
+            self.delete(products, order_ids)
+
+        outcomes = Counter(self.outcome(response) for _, response in results)
+        self.stdout.write(
+            f"{len(measured)} confirmations, {options['concurrency']} concurrent, "
+            f"{options['workers']} workers, {options['products']} hot products"
+        )
+        self.stdout.write(HEADER + f"{'confirmed/s':>14}")
+        self.stdout.write(
+            format_row([latency for latency, _ in results], elapsed)
+            + f"{outcomes['confirmed'] / elapsed:>14.1f}"
+        )
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{outcome:<24}{count:>8}")
+
+    def create_orders(self, options):
+        user = benchmark_user(options["email"])
+        count = options["requests"] + options["warmup"]
+        lines = min(options["lines"], options["products"])
+        stock = options["stock"]
+        if stock is None:
+            stock = count
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                Product(
+                    user=user,
+                    name=f"Benchmark hot product {index}",
+                    price="100.00",
+                    stock_quantity=stock,
+                )
+                for index in range(options["products"])
+            )
+            orders = Order.objects.bulk_create(Order(user=user) for _ in range(count))
+            # Orders list the products starting at different ones, so their
+            # locks would be taken in conflicting orders if not sorted.
+            OrderProduct.objects.bulk_create(
+                OrderProduct(
+                    order=order,
+                    product=products[(index + offset) % len(products)],
+                    quantity=1,
+                )
+                for index, order in enumerate(orders)
+                for offset in range(lines)
+            )
+        return products, orders
+
+    @staticmethod
+    def payloads(order_ids):
+        return [
+            {"ids": [order_id], "status": Order.StatusChoices.CONFIRMED}
+            for order_id in order_ids
+        ]
+
+    @staticmethod
+    def outcome(response):
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        (result,) = response.json()["results"]
+        if result["success"]:
+            return "confirmed"
+        if "Not enough stock" in result["error"]:
+            return "insufficient stock"
+        return "other error"
+
+    @staticmethod
+    def delete(products, order_ids):
+        Order.objects.filter(pk__in=order_ids).delete()
+        Product.objects.filter(pk__in=[product.pk for product in products]).delete()
@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from analytics.models import Order
+from report.services import SalesReport
+from shop_analytics.filters import created_between
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the query plan of the list and report queries that filter on a "
+        "created_at range. On PostgreSQL the queries are run with EXPLAIN ANALYZE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Length of the date range, ending today (default: 30).",
+        )
+        parser.add_argument(
+            "--status",
+            default=Order.StatusChoices.CONFIRMED,
+            help="Order status used by the order list query (default: confirmed).",
+        )
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            help="Client whose orders are listed (default: the newest client).",
+        )
+        parser.add_argument(
+            "--no-analyze",
+            action="store_true",
+            help="Only plan the queries instead of running them.",
+        )
+
+    def get_queries(self, options):
+        date_to = timezone.localdate()
+        date_from = date_to - timedelta(days=options["days"])
+        period = created_between(
+            {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+        )
+        page = settings.API_MAX_PAGE_SIZE + 1
+
+        user_id = options["user_id"]
+        if user_id is None:
+            user_id = (
+                User.objects.order_by("-created_at")
+                .values_list("pk", flat=True)
+                .first()
+            )
+
+        orders = Order.objects.order_by("-created_at", "-id")
+        yield (
+            "Order list by status and date",
+            orders.filter(status=options["status"], **period)[:page],
+        )
+        yield (
+            "Order list by client and date",
+            orders.filter(user_id=user_id, **period)[:page],
+        )
+        yield (
+            "Customer list by status and date",
+            User.objects.filter(is_active=True, **period).order_by(
+                "-created_at", "-id"
+            )[:page],
+        )
+        report = SalesReport(date_from, date_to)
+        yield (
+            "Report orders",
+            report.get_orders().order_by("created_at", "id"),
+        )
+
+    def handle(self, *args, **options):
+        analyze = connection.vendor == "postgresql" and not options["no_analyze"]
+        explain_options = {"analyze": True, "buffers": True} if analyze else {}
+
+        for title, queryset in self.get_queries(options):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
@@ -0,0 +1,40 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from analytics.importers import import_orders
+
+
+class Command(BaseCommand):
+    help = "Import orders from an NDJSON file (one order with its lines per row)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the NDJSON file, or '-' for stdin.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows validated and inserted together (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path == "-":
+            self.import_from(sys.stdin, options["chunk_size"])
+            return
+        with open(path, encoding="utf-8") as source:
+            self.import_from(source, options["chunk_size"])
+
+    def import_from(self, source, chunk_size):
+        for event in import_orders(source, chunk_size=chunk_size):
+            if event["type"] == "error":
+                self.stderr.write(
+                    f"Line {event['line']}: {json.dumps(event['errors'])}"
+                )
+            else:
+                summary = (
+                    f"Processed {event['processed']} rows: "
+                    f"{event['imported']} imported, {event['failed']} failed."
+                )
+                self.stdout.write(summary)
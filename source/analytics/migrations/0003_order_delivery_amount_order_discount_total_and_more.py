@@ -0,0 +1,67 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0002_order_apply_vat_order_delivery_cost_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="delivery_amount",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Delivery",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="discount_total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Discounts",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="subtotal",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Subtotal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Total (KZT)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="vat_amount",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=12,
+                verbose_name="VAT",
+            ),
+        ),
+    ]
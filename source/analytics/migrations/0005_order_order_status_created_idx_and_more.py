@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:46
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ("analytics", "0004_order_order_created_id_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "created_at"], name="order_status_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "created_at"], name="order_user_created_idx"
+            ),
+        ),
+    ]
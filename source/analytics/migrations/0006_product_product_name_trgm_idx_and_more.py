@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:49
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ("analytics", "0005_order_order_status_created_idx_and_more"),
+        # Installs the pg_trgm extension.
+        ("users", "0007_customuser_user_email_trgm_idx_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="product_name_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=GinIndex(
+                OpClass(Upper("description"), name="gin_trgm_ops"),
+                name="product_description_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=GinIndex(
+                SearchVector("name", "description", config="simple"),
+                name="product_search_idx",
+            ),
+        ),
+    ]
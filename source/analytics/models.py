@@ -1,10 +1,157 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+from shop_analytics.search import full_text_index, trigram_index
 
 User = get_user_model()
 
+ORDER_TOTAL_FIELDS = (
+    "subtotal",
+    "discount_total",
+    "vat_amount",
+    "delivery_amount",
+    "total",
+)
+
+
+# Sent after commit with ``order_ids`` and ``dates``: the orders whose status,
+# lines or totals changed while they were, or became, confirmed or shipped,
+# and their creation datetimes, so sales rollups can apply the orders' changes
+# and report caches can refresh the affected days.
+orders_changed = Signal()
+
+
+# Orders whose totals are refreshed at the end of a ``deferred_totals_refresh``
+# block rather than after each deleted line.
+_deferred_refresh = ContextVar("deferred_totals_refresh", default=None)
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+# Orders noted by notify_orders_changed() and not sent yet, per thread.
+_changed = threading.local()
+
+
+def _send_orders_changed():
+    orders = getattr(_changed, "orders", None)
+    if orders:
+        _changed.orders = {}
+        orders_changed.send(
+            sender=Order, order_ids=set(orders), dates=set(orders.values())
+        )
+
+
+def notify_orders_changed(orders):
+    """Send ``orders_changed`` for ``orders`` once the transaction commits.
+
+    ``orders`` yields ``(pk, created_at)`` pairs. Orders noted during one
+    transaction are sent together by its first commit callback, so an order
+    saved several times is refreshed only once.
+    """
+    orders = dict(orders)
+    if not orders:
+        return
+    if getattr(_changed, "orders", None) is None:
+        _changed.orders = {}
+    _changed.orders.update(orders)
+    transaction.on_commit(_send_orders_changed)
+
+
+def defer_totals_refresh(order_id):
+    """Refresh ``order_id`` at the end of the enclosing ``deferred_totals_refresh``.
+
+    Returns ``False`` outside such a block, where the caller refreshes it.
+    """
+    pending = _deferred_refresh.get()
+    if pending is None:
+        return False
+    pending.add(order_id)
+    return True
+
+
+@contextmanager
+def deferred_totals_refresh():
+    """Refresh every order whose lines are deleted in the block once, at its end.
+
+    Orders saved with ``refresh_totals()`` inside the block are not refreshed
+    again.
+    """
+    pending = set()
+    token = _deferred_refresh.set(pending)
+    try:
+        yield
+    finally:
+        _deferred_refresh.reset(token)
+    if pending:
+        Order.objects.filter(pk__in=pending).refresh_totals()
+
+
+class InsufficientStockError(ValidationError):
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(
+            [
+                f"Not enough stock for {name}: {requested} requested, {available} available."
+                for name, requested, available in shortages
+            ]
+        )
+
+
+class ProductQuerySet(models.QuerySet):
+    def reserve_stock(self, quantities):
+        """Atomically take ``{product_id: quantity}`` out of stock.
+
+        Product rows are locked in primary key order so concurrent reservations
+        cannot deadlock, then decremented with a single conditional UPDATE.
+        Raises ``InsufficientStockError`` listing every short product, leaving
+        stock untouched.
+        """
+        quantities = {pk: qty for pk, qty in quantities.items() if qty}
+        if not quantities:
+            return
+        with transaction.atomic():
+            locked = list(
+                self.select_for_update()
+                .filter(pk__in=quantities)
+                .order_by("pk")
+                .values_list("pk", "name", "stock_quantity")
+            )
+            shortages = [
+                (name, quantities[pk], stock)
+                for pk, name, stock in locked
+                if stock < quantities[pk]
+            ]
+            # Products that do not exist (any more) have nothing in stock.
+            found = {pk for pk, _, _ in locked}
+            shortages += [
+                (f"Product {pk}", qty, 0)
+                for pk, qty in quantities.items()
+                if pk not in found
+            ]
+            if shortages:
+                raise InsufficientStockError(shortages)
+
+            requested = Case(
+                *(When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()),
+                output_field=models.PositiveIntegerField(),
+            )
+            updated = self.filter(
+                pk__in=quantities, stock_quantity__gte=requested
+            ).update(stock_quantity=F("stock_quantity") - requested)
+            # The rows are locked and were checked above, so every one matches.
+            assert updated == len(quantities), (updated, quantities)
+
 
 class Product(models.Model):
     user = models.ForeignKey(
@@ -26,12 +173,203 @@ class Product(models.Model):
         verbose_name="Product Discount Percentage",
     )
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = (
+            trigram_index("name", "product_name_trgm_idx"),
+            trigram_index("description", "product_description_trgm_idx"),
+            full_text_index(["name", "description"], "product_search_idx"),
+        )
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate every order with the pricing breakdown of ``calculate_total``.
+
+        The whole computation runs in the database, so listing many orders no
+        longer needs a query (and a Python Decimal loop) per order.
+        """
+        money = DecimalField(max_digits=20, decimal_places=6)
+        zero = Value(Decimal(0), output_field=money)
+
+        def lines_sum(expression):
+            lines = (
+                OrderProduct.objects.filter(order=OuterRef("pk"))
+                .order_by()
+                .values("order")
+                .annotate(amount=Sum(expression, output_field=money))
+                .values("amount")
+            )
+            return Coalesce(Subquery(lines, output_field=money), zero)
+
+        return (
+            self.annotate(
+                calculated_items_total=lines_sum(F("quantity") * F("product__price")),
+                calculated_product_discount=lines_sum(
+                    F("quantity")
+                    * F("product__price")
+                    * F("product__discount_percentage")
+                    * Value(Decimal("0.01"))
+                ),
+                calculated_client_discount_rate=Coalesce(
+                    F("user__client_discount__discount_percentage"),
+                    zero,
+                    output_field=money,
+                )
+                * Value(Decimal("0.01")),
+            )
+            .annotate(
+                calculated_client_discount=F("calculated_client_discount_rate")
+                * F("calculated_items_total"),
+                calculated_global_discount=Case(
+                    When(
+                        calculated_items_total__gt=Decimal(150000),
+                        then=Value(Decimal("0.10")) * F("calculated_items_total"),
+                    ),
+                    default=zero,
+                    output_field=money,
+                ),
+            )
+            .annotate(
+                calculated_discount_total=F("calculated_client_discount")
+                + F("calculated_product_discount")
+                + F("calculated_global_discount"),
+            )
+            .annotate(
+                calculated_subtotal=F("calculated_items_total")
+                - F("calculated_discount_total"),
+            )
+            .annotate(
+                calculated_vat=Case(
+                    When(
+                        apply_vat=True,
+                        then=Value(Decimal("0.12")) * F("calculated_subtotal"),
+                    ),
+                    default=zero,
+                    output_field=money,
+                ),
+                calculated_delivery=Case(
+                    When(calculated_subtotal__gt=Decimal(2000), then=zero),
+                    default=F("delivery_cost"),
+                    output_field=money,
+                ),
+            )
+            .annotate(
+                calculated_total=F("calculated_subtotal")
+                + F("calculated_vat")
+                + F("calculated_delivery"),
+            )
+        )
+
+    def refresh_totals(self, batch_size=1000):
+        """Recompute and store the pricing columns of every order in the queryset.
+
+        Orders are read and written ``batch_size`` at a time in primary key
+        order, so refreshing the orders of a popular product keeps memory flat.
+        Returns the number of orders that were written.
+        """
+        written, last_pk = 0, 0
+        while True:
+            rows = list(
+                self.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .with_totals()
+                .values_list(
+                    "pk",
+                    "created_at",
+                    "status",
+                    "calculated_subtotal",
+                    "calculated_discount_total",
+                    "calculated_vat",
+                    "calculated_delivery",
+                    "calculated_total",
+                )[:batch_size]
+            )
+            if not rows:
+                return written
+            Order.objects.bulk_update(
+                [
+                    Order(
+                        pk=row[0], **dict(zip(ORDER_TOTAL_FIELDS, map(_money, row[3:])))
+                    )
+                    for row in rows
+                ],
+                ORDER_TOTAL_FIELDS,
+            )
+            notify_orders_changed(
+                row[:2] for row in rows if row[2] in Order.SALES_STATUSES
+            )
+            written += len(rows)
+            last_pk = rows[-1][0]
+
+    def transition_to(self, status):
+        """Move every order in the queryset to ``status`` in one transaction.
+
+        Stock for orders being confirmed is aggregated per product and reserved
+        with a single ``reserve_stock`` call. Orders whose lines cannot be
+        covered by the remaining stock are left unchanged. Returns
+        ``{order_id: error}`` where ``error`` is ``None`` on success.
+        """
+        with transaction.atomic():
+            current = {
+                pk: (old_status, created_at)
+                for pk, old_status, created_at in self.select_for_update()
+                .order_by("pk")
+                .values_list("pk", "status", "created_at")
+            }
+            results = dict.fromkeys(current)
+            to_move = [pk for pk, (old, _) in current.items() if old != status]
+
+            if status == Order.StatusChoices.CONFIRMED and to_move:
+                requested = {}
+                lines = (
+                    OrderProduct.objects.filter(order_id__in=to_move)
+                    .values("order_id", "product_id")
+                    .annotate(total=Sum("quantity"))
+                    .order_by()
+                    .values_list("order_id", "product_id", "total")
+                )
+                for order_id, product_id, quantity in lines:
+                    requested.setdefault(order_id, {})[product_id] = quantity
+
+                product_ids = {pk for lines in requested.values() for pk in lines}
+                stock = {
+                    pk: [name, quantity]
+                    for pk, name, quantity in Product.objects.select_for_update()
+                    .filter(pk__in=product_ids)
+                    .order_by("pk")
+                    .values_list("pk", "name", "stock_quantity")
+                }
+                reserved = {}
+                for order_id in list(to_move):
+                    short = [
+                        f"Not enough stock for {stock[pk][0]}: {quantity} requested, {stock[pk][1]} available."
+                        for pk, quantity in requested.get(order_id, {}).items()
+                        if stock[pk][1] < quantity
+                    ]
+                    if short:
+                        results[order_id] = " ".join(short)
+                        to_move.remove(order_id)
+                        continue
+                    for pk, quantity in requested.get(order_id, {}).items():
+                        stock[pk][1] -= quantity
+                        reserved[pk] = reserved.get(pk, 0) + quantity
+                Product.objects.reserve_stock(reserved)
+
+            Order.objects.filter(pk__in=to_move).update(status=status)
+            notify_orders_changed(
+                (pk, current[pk][1])
+                for pk in to_move
+                if status in Order.SALES_STATUSES
+                or current[pk][0] in Order.SALES_STATUSES
+            )
+        return results
 
 
 class Order(models.Model):
@@ -41,6 +379,9 @@ class Order(models.Model):
         SHIPPED = "shipped", "Shipped"
         CANCELLED = "cancelled", "Cancelled"
 
+    # Statuses counted as sales by reports.
+    SALES_STATUSES = (StatusChoices.CONFIRMED, StatusChoices.SHIPPED)
+
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="orders", verbose_name="Client"
     )
@@ -55,6 +396,43 @@ class Order(models.Model):
     delivery_cost = models.DecimalField(
         max_digits=10, decimal_places=2, default=0.00, verbose_name="Delivery Cost"
     )
+    subtotal = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        verbose_name="Subtotal",
+    )
+    discount_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        verbose_name="Discounts",
+    )
+    vat_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        verbose_name="VAT",
+    )
+    delivery_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        verbose_name="Delivery",
+    )
+    total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        verbose_name="Total (KZT)",
+    )
+
+    objects = OrderQuerySet.as_manager()
 
     def __str__(self):
         return f"Order {self.id} by {self.user.full_name} ({self.status})"
@@ -62,6 +440,13 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = (
+            models.Index(fields=["created_at", "id"], name="order_created_id_idx"),
+            models.Index(
+                fields=["status", "created_at"], name="order_status_created_idx"
+            ),
+            models.Index(fields=["user", "created_at"], name="order_user_created_idx"),
+        )
 
     def calculate_total(self):
         items_total = sum(op.quantity * op.product.price for op in self.products.all())
@@ -74,7 +459,7 @@ class Order(models.Model):
             op.quantity * op.product.price * (op.product.discount_percentage / 100)
             for op in self.products.all()
         )
-        global_discount = 0.10 * items_total if items_total > 150000 else 0
+        global_discount = Decimal("0.10") * items_total if items_total > 150000 else 0
         discounts = client_discount * items_total + product_discount + global_discount
         subtotal = items_total - discounts
         vat = Decimal("0.12") * subtotal if self.apply_vat else 0
@@ -82,22 +467,112 @@ class Order(models.Model):
         return subtotal + vat + delivery
 
     def clean(self):
-        for op in self.products.all():
+        for op in self.products.select_related("product"):
             if op.quantity > op.product.stock_quantity:
                 raise ValidationError(
                     f"Not enough stock for {op.product.name}: {op.quantity} requested, {op.product.stock_quantity} available."
                 )
 
+    def requested_quantities(self):
+        """Return ``{product_id: quantity}`` summed over the order lines."""
+        return dict(
+            self.products.order_by()
+            .values("product_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("product_id", "total")
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        order._remember_saved_state()
+        return order
+
+    def _saved_state(self):
+        deferred = self.get_deferred_fields()
+        if deferred & {"status", "user_id", "apply_vat", "delivery_cost"}:
+            return None
+        return (
+            self.status,
+            (self.user_id, self.apply_vat, Decimal(str(self.delivery_cost))),
+        )
+
+    def _remember_saved_state(self):
+        self._loaded_state = self._saved_state()
+
+    def _changed_since_load(self):
+        """Return whether the status and the pricing inputs changed since loading,
+        and whether the order was counted as a sale before."""
+        loaded, current = getattr(self, "_loaded_state", None), self._saved_state()
+        if loaded is None or current is None:
+            return True, True, not self._state.adding
+        return (
+            loaded[0] != current[0],
+            loaded[1] != current[1],
+            loaded[0] in self.SALES_STATUSES,
+        )
+
+    def mark_lines_changed(self):
+        """Have the next ``save()`` refresh the totals after lines were written in bulk."""
+        self._lines_changed = True
+
     def save(self, *args, **kwargs):
-        if self.status == "confirmed" and self.pk:
-            original = Order.objects.get(pk=self.pk)
-            if original.status != "confirmed":
-                self.clean()
-                for op in self.products.all():
-                    product = op.product
-                    product.stock_quantity -= op.quantity
-                    product.save()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        status_changed, pricing_changed, was_sale = self._changed_since_load()
+        refresh = getattr(self, "_lines_changed", False) or (
+            pricing_changed and not adding
+        )
+        if adding:
+            # A new order has no lines yet, so its total is the delivery cost.
+            self.subtotal = self.discount_total = self.vat_amount = Decimal("0.00")
+            self.delivery_amount = self.total = _money(self.delivery_cost)
+
+        with transaction.atomic():
+            if self.status == self.StatusChoices.CONFIRMED and self.pk:
+                original_status = (
+                    Order.objects.select_for_update()
+                    .values_list("status", flat=True)
+                    .get(pk=self.pk)
+                )
+                if original_status != self.StatusChoices.CONFIRMED:
+                    Product.objects.reserve_stock(self.requested_quantities())
+            super().save(*args, **kwargs)
+            # Totals only depend on the lines, the client and the VAT and
+            # delivery settings, so other edits skip the refresh.
+            if refresh:
+                self.refresh_totals()
+            if status_changed and (was_sale or self.status in self.SALES_STATUSES):
+                notify_orders_changed([(self.pk, self.created_at)])
+        self._lines_changed = False
+        self._remember_saved_state()
+
+    def refresh_totals(self):
+        """Recompute the stored pricing columns from the current order lines."""
+        row = (
+            Order.objects.with_totals()
+            .filter(pk=self.pk)
+            .values_list(
+                "calculated_subtotal",
+                "calculated_discount_total",
+                "calculated_vat",
+                "calculated_delivery",
+                "calculated_total",
+                "status",
+                "created_at",
+            )
+            .get()
+        )
+        totals = dict(zip(ORDER_TOTAL_FIELDS, map(_money, row[:-2])))
+        Order.objects.filter(pk=self.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(self, field, value)
+        pending = _deferred_refresh.get()
+        if pending is not None:
+            pending.discard(self.pk)
+        # Stored values, as this instance may predate a bulk update.
+        status, created_at = row[-2:]
+        if status in self.SALES_STATUSES:
+            notify_orders_changed([(self.pk, created_at)])
 
 
 class OrderProduct(models.Model):
@@ -115,6 +590,10 @@ class OrderProduct(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order {self.order.id}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.order.refresh_totals()
+
     class Meta:
         verbose_name = "Order Item"
         verbose_name_plural = "Order Items"
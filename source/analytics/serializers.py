@@ -1,6 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers
-from .models import Product, Order, OrderProduct
+from .models import (
+    InsufficientStockError,
+    Order,
+    OrderProduct,
+    Product,
+    deferred_totals_refresh,
+)
 
 User = get_user_model()
 
@@ -20,31 +27,72 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderProductSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
-
-    def validate(self, data):
-        product = data["product"]
-        quantity = data["quantity"]
-        if not product.is_active:
-            raise serializers.ValidationError(
-                f"Product {product.name} is not available for order."
-            )
-        if quantity > product.stock_quantity:
-            raise serializers.ValidationError(
-                f"Not enough stock for {product.name}: {quantity} requested, {product.stock_quantity} available."
+class OrderProductListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        """Resolve every line's product with a single ``in_bulk`` query.
+
+        Availability and stock are checked against the quantity requested for
+        each product across all lines, and every offending line is reported.
+        """
+        lines = super().to_internal_value(data)
+        products = Product.objects.in_bulk({line["product_id"] for line in lines})
+
+        requested = {}
+        for line in lines:
+            requested[line["product_id"]] = (
+                requested.get(line["product_id"], 0) + line["quantity"]
             )
-        return data
+
+        errors = []
+        for line in lines:
+            product = products.get(line["product_id"])
+            quantity = requested[line["product_id"]]
+            if product is None:
+                errors.append(
+                    {
+                        "product": [
+                            f'Invalid pk "{line["product_id"]}" - object does not exist.'
+                        ]
+                    }
+                )
+            elif not product.is_active:
+                errors.append(
+                    {
+                        "non_field_errors": [
+                            f"Product {product.name} is not available for order."
+                        ]
+                    }
+                )
+            elif quantity > product.stock_quantity:
+                errors.append(
+                    {
+                        "non_field_errors": [
+                            f"Not enough stock for {product.name}: {quantity} requested, {product.stock_quantity} available."
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        for line in lines:
+            line["product"] = products[line.pop("product_id")]
+        return lines
+
+
+class OrderProductSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source="product_id", min_value=1)
 
     class Meta:
         model = OrderProduct
         fields = ["id", "product", "quantity"]
+        list_serializer_class = OrderProductListSerializer
 
 
 class OrderSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     products = OrderProductSerializer(many=True)
-    total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     def validate_products(self, value):
         if not value:
@@ -54,33 +102,62 @@ class OrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         products_data = validated_data.pop("products")
         delivery_cost = validated_data.pop("delivery_cost", 200)
-        order = Order.objects.create(delivery_cost=delivery_cost, **validated_data)
-        for product_data in products_data:
-            OrderProduct.objects.create(order=order, **product_data)
-        order.total = order.calculate_total()
-        order.save()
+        with transaction.atomic():
+            order = Order.objects.create(delivery_cost=delivery_cost, **validated_data)
+            OrderProduct.objects.bulk_create(
+                OrderProduct(order=order, **product_data)
+                for product_data in products_data
+            )
+            order.refresh_totals()
         return order
 
     def update(self, instance, validated_data):
         products_data = validated_data.pop("products", None)
-        instance.user = validated_data.get("user", instance.user)
-        instance.status = validated_data.get("status", instance.status)
-        instance.apply_vat = validated_data.get("apply_vat", instance.apply_vat)
-        instance.delivery_cost = validated_data.get(
-            "delivery_cost", instance.delivery_cost
-        )
-        if products_data is not None:
-            instance.products.all().delete()
-            for product_data in products_data:
-                OrderProduct.objects.create(order=instance, **product_data)
-        instance.total = instance.calculate_total()
-        instance.save()
+        for field in ("user", "status", "apply_vat", "delivery_cost"):
+            if field in validated_data:
+                setattr(instance, field, validated_data[field])
+        try:
+            with transaction.atomic(), deferred_totals_refresh():
+                if products_data is not None:
+                    self._sync_lines(instance, products_data)
+                instance.save()
+        except InsufficientStockError as exc:
+            raise serializers.ValidationError({"products": exc.messages})
         return instance
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation["total"] = instance.calculate_total()
-        return representation
+    def _sync_lines(self, order, products_data):
+        """Apply the submitted lines to ``order`` touching only changed rows.
+
+        Submitted lines are matched to existing ones by product; quantities are
+        bulk-updated, unmatched lines are bulk-inserted and leftovers deleted.
+        The order refreshes its totals when it is saved next.
+        """
+        unmatched = {}
+        for line in order.products.all():
+            unmatched.setdefault(line.product_id, []).append(line)
+
+        to_create, to_update = [], []
+        for product_data in products_data:
+            existing = unmatched.get(product_data["product"].pk)
+            if not existing:
+                to_create.append(OrderProduct(order=order, **product_data))
+                continue
+            line = existing.pop(0)
+            if line.quantity != product_data["quantity"]:
+                line.quantity = product_data["quantity"]
+                to_update.append(line)
+
+        to_delete = [line.pk for lines in unmatched.values() for line in lines]
+        if to_delete:
+            OrderProduct.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            OrderProduct.objects.bulk_update(to_update, ["quantity"])
+        if to_create:
+            OrderProduct.objects.bulk_create(to_create)
+        if to_delete or to_update or to_create:
+            order.mark_lines_changed()
+        if hasattr(order, "_prefetched_objects_cache"):
+            order._prefetched_objects_cache.pop("products", None)
 
     class Meta:
         model = Order
@@ -92,5 +169,16 @@ class OrderSerializer(serializers.ModelSerializer):
             "apply_vat",
             "delivery_cost",
             "products",
+            "subtotal",
+            "discount_total",
+            "vat_amount",
+            "delivery_amount",
             "total",
         ]
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=10000
+    )
+    status = serializers.ChoiceField(choices=Order.StatusChoices.choices)
@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import ClientDiscount
+
+from .models import (
+    Order,
+    OrderProduct,
+    Product,
+    defer_totals_refresh,
+    notify_orders_changed,
+)
+
+PRODUCT_PRICING_FIELDS = {"price", "discount_percentage"}
+
+
+@receiver(pre_save, sender=Product)
+def detect_product_pricing_change(
+    sender, instance, raw=False, update_fields=None, **kwargs
+):
+    instance._pricing_changed = False
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not PRODUCT_PRICING_FIELDS & set(update_fields):
+        return
+    instance._pricing_changed = not Product.objects.filter(
+        pk=instance.pk,
+        price=instance.price,
+        discount_percentage=instance.discount_percentage,
+    ).exists()
+
+
+@receiver(post_save, sender=Product)
+def refresh_totals_on_product_change(sender, instance, **kwargs):
+    if getattr(instance, "_pricing_changed", False):
+        order_ids = OrderProduct.objects.filter(product=instance).values("order_id")
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
+
+
+@receiver(post_save, sender=ClientDiscount)
+@receiver(post_delete, sender=ClientDiscount)
+def refresh_totals_on_client_discount_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Order.objects.filter(user_id=instance.user_id).refresh_totals()
+
+
+@receiver(post_delete, sender=OrderProduct)
+def refresh_totals_on_line_delete(sender, instance, origin=None, **kwargs):
+    # Lines deleted along with their order leave nothing to refresh.
+    if isinstance(origin, Order) or getattr(origin, "model", None) is Order:
+        return
+    if not defer_totals_refresh(instance.order_id):
+        Order.objects.filter(pk=instance.order_id).refresh_totals()
+
+
+@receiver(post_delete, sender=Order)
+def notify_order_deleted(sender, instance, **kwargs):
+    if instance.status in Order.SALES_STATUSES:
+        notify_orders_changed([(instance.pk, instance.created_at)])
@@ -1,3 +1,919 @@
-from django.test import TestCase
+import contextvars
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from io import StringIO
+from itertools import chain
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection, router
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop_analytics import db_router
+from shop_analytics.async_views import streaming_content
+from shop_analytics.db_router import (
+    ReplicaRoutingMiddleware,
+    check_pin_cache,
+    primary_reads_after,
+    replica_reads,
+    replica_usable,
+    use_replica,
+)
+from shop_analytics.pagination import CreatedAtKeysetPagination
+from users.models import ClientDiscount
+
+from .admin import OrderAdmin, ProductAdmin
+from .models import InsufficientStockError, Order, OrderProduct, Product
+from .pricing import price_orders
+
+User = get_user_model()
+
+
+class OrderFixturesMixin:
+    """Create users, products and orders covering every pricing rule."""
+
+    @classmethod
+    def create_user(cls, email="client@example.com", **extra):
+        return User.objects.create_user(email, "Client", "password", **extra)
+
+    @classmethod
+    def create_product(cls, owner, name="Product", price="100.00", **extra):
+        extra.setdefault("stock_quantity", 1000)
+        return Product.objects.create(user=owner, name=name, price=price, **extra)
+
+    @classmethod
+    def create_order(cls, user, lines, **extra):
+        order = Order.objects.create(user=user, **extra)
+        OrderProduct.objects.bulk_create(
+            OrderProduct(order=order, product=product, quantity=quantity)
+            for product, quantity in lines
+        )
+        order.refresh_totals()
+        return order
+
+
+class OrderPricingParityTests(OrderFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = cls.create_user("owner@example.com", is_staff=True)
+        client = cls.create_user()
+        ClientDiscount.objects.create(user=client, discount_percentage="7.50")
+        cheap = cls.create_product(owner, "Cheap", "19.99", discount_percentage="3.33")
+        plain = cls.create_product(owner, "Plain", "1250.00")
+        luxury = cls.create_product(
+            owner, "Luxury", "99999.99", discount_percentage="12.50"
+        )
+
+        cls.orders = [
+            # Below the free delivery threshold, with and without VAT.
+            cls.create_order(owner, [(cheap, 3)], delivery_cost="200.00"),
+            cls.create_order(owner, [(cheap, 7)], apply_vat=True, delivery_cost="350"),
+            # Client discount, free delivery.
+            cls.create_order(client, [(plain, 2), (cheap, 1)], apply_vat=True),
+            # Volume discount over 150000 on top of product and client discounts.
+            cls.create_order(client, [(luxury, 2), (plain, 5)], apply_vat=True),
+            # Duplicate lines of one product.
+            cls.create_order(owner, [(luxury, 1), (luxury, 1), (cheap, 11)]),
+            # No lines at all.
+            cls.create_order(owner, [], delivery_cost="150.00"),
+        ]
+
+    def test_with_totals_matches_calculate_total(self):
+        annotated = Order.objects.with_totals().in_bulk(
+            [order.pk for order in self.orders]
+        )
+        for order in self.orders:
+            with self.subTest(order=order.pk):
+                expected = Order.objects.get(pk=order.pk).calculate_total()
+                self.assertEqual(annotated[order.pk].calculated_total, expected)
+
+    def test_price_orders_matches_calculate_total(self):
+        order_ids = [order.pk for order in self.orders]
+        with self.assertNumQueries(4):
+            totals = price_orders(order_ids, chunk_size=4)
+
+        self.assertEqual(set(totals), set(order_ids))
+        for order in Order.objects.filter(pk__in=order_ids):
+            with self.subTest(order=order.pk):
+                self.assertEqual(totals[order.pk], order.calculate_total())
+
+    def test_stored_total_is_calculate_total_rounded(self):
+        for order in Order.objects.filter(pk__in=[order.pk for order in self.orders]):
+            with self.subTest(order=order.pk):
+                expected = Decimal(order.calculate_total()).quantize(
+                    Decimal("0.01"), rounding=ROUND_HALF_UP
+                )
+                self.assertEqual(order.total, expected)
+
+
+class StoredTotalsTests(OrderFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.product = cls.create_product(cls.owner, price="500.00")
+        cls.other = cls.create_product(cls.owner, "Other", price="50.00")
+
+    def test_new_order_total_is_delivery_cost(self):
+        order = Order.objects.create(user=self.owner, delivery_cost="200.00")
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("200.00"))
+        self.assertEqual(order.delivery_amount, Decimal("200.00"))
+
+    def test_pricing_change_refreshes_totals(self):
+        order = self.create_order(self.owner, [(self.product, 2)], delivery_cost=200)
+        self.assertEqual(order.total, Decimal("1200.00"))
+
+        order = Order.objects.get(pk=order.pk)
+        order.apply_vat = True
+        order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("1320.00"))
+
+    def test_status_change_skips_totals_refresh(self):
+        order = Order.objects.get(
+            pk=self.create_order(self.owner, [(self.product, 1)]).pk
+        )
+        order.status = Order.StatusChoices.CANCELLED
+        # Savepoint, UPDATE and release; the totals are not recomputed.
+        with self.assertNumQueries(3):
+            order.save()
+
+    def test_product_price_change_refreshes_orders_in_batches(self):
+        orders = [
+            self.create_order(self.owner, [(self.product, 1), (self.other, 1)])
+            for _ in range(5)
+        ]
+        untouched = self.create_order(self.owner, [(self.other, 3)])
+
+        self.product.price = Decimal("3000.00")
+        self.product.save()
+
+        for order in Order.objects.filter(pk__in=[order.pk for order in orders]):
+            self.assertEqual(order.total, Decimal("3050.00"))
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.total, Decimal("150.00"))
+
+        self.assertEqual(Order.objects.all().refresh_totals(batch_size=2), 6)
+
+    def test_client_discount_change_refreshes_totals(self):
+        client = self.create_user()
+        order = self.create_order(client, [(self.product, 10)])
+        ClientDiscount.objects.create(user=client, discount_percentage=10)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("4500.00"))
+
+    def test_backfill_order_totals(self):
+        order = self.create_order(self.owner, [(self.product, 1)], delivery_cost=100)
+        Order.objects.filter(pk=order.pk).update(total=0, subtotal=0)
+
+        call_command("backfill_order_totals", batch_size=1, stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("500.00"))
+        self.assertEqual(order.total, Decimal("600.00"))
+
+
+class OrderApiQueryCountTests(OrderFixturesMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.products = [
+            cls.create_product(cls.owner, f"Product {index}") for index in range(6)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+
+    def order_payload(self, lines, **extra):
+        return {
+            "user": self.owner.pk,
+            "products": [
+                {"product": product.pk, "quantity": quantity}
+                for product, quantity in lines
+            ],
+            **extra,
+        }
+
+    def create_orders(self, count, lines_per_order):
+        return [
+            self.create_order(
+                self.owner,
+                [(product, 1) for product in self.products[:lines_per_order]],
+            )
+            for _ in range(count)
+        ]
+
+    def test_list(self):
+        for count in (1, 5):
+            Order.objects.all().delete()
+            self.create_orders(count, lines_per_order=3)
+            # The page of orders and their lines.
+            with self.subTest(orders=count), self.assertNumQueries(2):
+                response = self.client.get("/api/orders/")
+            self.assertEqual(len(response.json()["results"]), count)
+
+    def test_retrieve(self):
+        for lines in (1, 6):
+            (order,) = self.create_orders(1, lines_per_order=lines)
+            with self.subTest(lines=lines), self.assertNumQueries(2):
+                response = self.client.get(f"/api/orders/{order.pk}/")
+            self.assertEqual(len(response.json()["products"]), lines)
+
+    def test_create(self):
+        for lines in (1, 6):
+            payload = self.order_payload(
+                [(product, 1) for product in self.products[:lines]]
+            )
+            # Client and products lookups, savepoints, the order and its lines,
+            # one totals refresh and the lines of the response.
+            with self.subTest(lines=lines), self.assertNumQueries(11):
+                response = self.client.post("/api/orders/", payload, format="json")
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(len(response.json()["products"]), lines)
+
+    def test_update(self):
+        for lines in (1, 6):
+            (order,) = self.create_orders(1, lines_per_order=lines)
+            payload = self.order_payload(
+                [(product, 2) for product in self.products[:lines]], apply_vat=True
+            )
+            # The order and its lines, client and products lookups, savepoints,
+            # one bulk update of the lines, the order, one totals refresh and
+            # the lines of the response.
+            with self.subTest(lines=lines), self.assertNumQueries(13):
+                response = self.client.put(
+                    f"/api/orders/{order.pk}/", payload, format="json"
+                )
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(Decimal(response.json()["total"]), lines * 224)
+
+
+class LineDeletionTests(OrderFixturesMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.products = [
+            cls.create_product(cls.owner, f"Product {index}") for index in range(6)
+        ]
+
+    def setUp(self):
+        self.order = self.create_order(
+            self.owner, [(product, 1) for product in self.products]
+        )
+
+    def assertTotal(self, total):
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal(total))
+
+    def test_instance_delete_refreshes_totals(self):
+        self.order.products.first().delete()
+        self.assertTotal("500.00")
+
+    def test_queryset_delete_refreshes_totals(self):
+        OrderProduct.objects.filter(product__in=self.products[:4]).delete()
+        self.assertTotal("200.00")
+
+    def test_product_delete_cascades_to_totals(self):
+        self.products[0].delete()
+        self.assertTotal("500.00")
+
+    def test_order_delete_with_lines(self):
+        self.order.delete()
+        self.assertFalse(OrderProduct.objects.exists())
+
+    def test_update_removing_lines_refreshes_once(self):
+        self.client.force_authenticate(self.owner)
+        for kept in (5, 1):
+            payload = {
+                "user": self.owner.pk,
+                "products": [
+                    {"product": product.pk, "quantity": 1}
+                    for product in self.products[:kept]
+                ],
+            }
+            # One query more than an update of quantities: the deleted lines
+            # are fetched for their post_delete signal.
+            with self.subTest(kept=kept), self.assertNumQueries(14):
+                response = self.client.put(
+                    f"/api/orders/{self.order.pk}/", payload, format="json"
+                )
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertTotal(f"{kept * 100}.00")
+            OrderProduct.objects.bulk_create(
+                OrderProduct(order=self.order, product=product, quantity=1)
+                for product in self.products[kept:]
+            )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentReservationTests(OrderFixturesMixin, TransactionTestCase):
+    def test_concurrent_reservations_neither_oversell_nor_deadlock(self):
+        owner = self.create_user("owner@example.com", is_staff=True)
+        first = self.create_product(owner, "First", stock_quantity=10)
+        second = self.create_product(owner, "Second", stock_quantity=10)
+        # Half of the workers list the products in the opposite order.
+        requests = [
+            {first.pk: 1, second.pk: 1} if index % 2 else {second.pk: 1, first.pk: 1}
+            for index in range(24)
+        ]
+        barrier = threading.Barrier(len(requests))
+        outcomes = []
+
+        def reserve(quantities):
+            try:
+                barrier.wait()
+                Product.objects.reserve_stock(quantities)
+                outcomes.append("reserved")
+            except InsufficientStockError:
+                outcomes.append("short")
+            except DatabaseError as exc:
+                # A deadlock or lock timeout.
+                outcomes.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=reserve, args=(quantities,))
+            for quantities in requests
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(sorted(outcomes), ["reserved"] * 10 + ["short"] * 14)
+        self.assertEqual(
+            list(
+                Product.objects.order_by("pk").values_list("stock_quantity", flat=True)
+            ),
+            [0, 0],
+        )
+
+
+class BulkTransitionTests(OrderFixturesMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.client_user = cls.create_user()
+        cls.product = cls.create_product(cls.owner, stock_quantity=5)
+
+    def transition(self, ids, status, user=None):
+        self.client.force_authenticate(user or self.owner)
+        return self.client.post(
+            "/api/orders/bulk-transition/",
+            {"ids": ids, "status": status},
+            format="json",
+        )
+
+    def test_confirm_reserves_stock_until_it_runs_out(self):
+        orders = [self.create_order(self.owner, [(self.product, 2)]) for _ in range(3)]
+
+        response = self.transition(
+            [order.pk for order in orders] + [999999], Order.StatusChoices.CONFIRMED
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [result["success"] for result in results], [True, True, False, False]
+        )
+        self.assertIn("Not enough stock", results[2]["error"])
+        self.assertEqual(results[3]["error"], "Order not found.")
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+        self.assertEqual(
+            list(Order.objects.order_by("pk").values_list("status", flat=True)),
+            ["confirmed", "confirmed", "draft"],
+        )
+
+    def test_already_confirmed_orders_reserve_nothing(self):
+        order = self.create_order(self.owner, [(self.product, 2)])
+        self.transition([order.pk], Order.StatusChoices.CONFIRMED)
+        response = self.transition([order.pk], Order.StatusChoices.CONFIRMED)
+
+        self.assertTrue(response.json()["results"][0]["success"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+
+    def test_clients_only_transition_their_own_orders(self):
+        own = self.create_order(self.client_user, [(self.product, 1)])
+        other = self.create_order(self.owner, [(self.product, 1)])
+
+        response = self.transition(
+            [own.pk, other.pk], Order.StatusChoices.CANCELLED, user=self.client_user
+        )
+        self.assertEqual(
+            [result["success"] for result in response.json()["results"]],
+            [True, False],
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.status, Order.StatusChoices.DRAFT)
+
+    def test_saving_a_confirmed_order_reserves_stock(self):
+        order = Order.objects.get(
+            pk=self.create_order(self.owner, [(self.product, 4)]).pk
+        )
+        order.status = Order.StatusChoices.CONFIRMED
+        order.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+
+        order = Order.objects.get(
+            pk=self.create_order(self.owner, [(self.product, 4)]).pk
+        )
+        order.status = Order.StatusChoices.CONFIRMED
+        with self.assertRaises(InsufficientStockError):
+            order.save()
+
+    def test_only_short_and_missing_products_are_reported(self):
+        other = self.create_product(self.owner, "Other", stock_quantity=5)
+
+        with self.assertRaises(InsufficientStockError) as raised:
+            Product.objects.reserve_stock({self.product.pk: 6, other.pk: 1, 999999: 2})
+
+        self.assertEqual(
+            raised.exception.shortages,
+            [(self.product.name, 6, 5), ("Product 999999", 2, 0)],
+        )
+        self.assertEqual(
+            list(
+                Product.objects.order_by("pk").values_list("stock_quantity", flat=True)
+            ),
+            [5, 5],
+        )
+
+
+class OrderImportTests(OrderFixturesMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.product = cls.create_product(cls.owner, stock_quantity=1)
+
+    def rows(self, count):
+        return [
+            json.dumps(
+                {
+                    "user": self.owner.pk,
+                    "status": "confirmed",
+                    "created_at": f"2024-03-0{index % 9 + 1}T10:00:00Z",
+                    "products": [{"product": self.product.pk, "quantity": 2}],
+                }
+            )
+            for index in range(count)
+        ]
+
+    def post(self, lines, **params):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(
+            "/api/orders/import/?" + urlencode(params),
+            "\n".join(lines).encode(),
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+    def test_import_reports_errors_and_progress(self):
+        lines = self.rows(3)
+        lines[1] = "{not json"
+        lines.insert(2, json.dumps({"user": 999999, "products": []}))
+        lines.append(
+            json.dumps(
+                {
+                    "user": self.owner.pk,
+                    "products": [{"product": 999999, "quantity": 1}],
+                }
+            )
+        )
+
+        events = self.post(lines, chunk_size=2)
+        self.assertEqual(
+            [(event["type"], event.get("line")) for event in events],
+            [
+                ("error", 2),
+                ("error", 3),
+                ("progress", None),
+                ("error", 5),
+                ("progress", None),
+            ],
+        )
+        self.assertEqual(
+            events[-1],
+            {"type": "progress", "processed": 5, "imported": 2, "failed": 3},
+        )
+
+        # Imported orders keep their status and date and reserve no stock.
+        order = Order.objects.get(created_at__date="2024-03-01")
+        self.assertEqual(order.status, Order.StatusChoices.CONFIRMED)
+        self.assertEqual(order.total, Decimal("400.00"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+
+    @override_settings(IMPORT_MAX_CHUNK_SIZE=2)
+    def test_chunk_size_is_clamped(self):
+        events = self.post(self.rows(5), chunk_size=1000)
+        self.assertEqual(
+            [event["processed"] for event in events if event["type"] == "progress"],
+            [2, 4, 5],
+        )
+        self.assertEqual(Order.objects.count(), 5)
+
+    def test_invalid_chunk_size(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(
+            "/api/orders/import/?chunk_size=many",
+            b"",
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_orders_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as source:
+            source.write("\n".join(self.rows(3)))
+            source.flush()
+            stdout = StringIO()
+            call_command("import_orders", source.name, chunk_size=2, stdout=stdout)
+
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertIn("Processed 3 rows: 3 imported, 0 failed.", stdout.getvalue())
+
+
+class OrderLineValidationTests(OrderFixturesMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.product = cls.create_product(cls.owner, stock_quantity=3)
+        cls.inactive = cls.create_product(cls.owner, "Inactive", is_active=False)
+
+    def test_every_offending_line_is_reported(self):
+        self.client.force_authenticate(self.owner)
+        lines = [
+            {"product": self.product.pk, "quantity": 2},
+            {"product": self.inactive.pk, "quantity": 1},
+            {"product": 999999, "quantity": 1},
+            # Stock is checked against the quantity of both lines together.
+            {"product": self.product.pk, "quantity": 2},
+        ]
+        # The client lookup and one query resolving every product.
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                "/api/orders/",
+                {"user": self.owner.pk, "products": lines},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["products"]
+        self.assertIn("Not enough stock", errors[0]["non_field_errors"][0])
+        self.assertIn("not available", errors[1]["non_field_errors"][0])
+        self.assertIn("does not exist", errors[2]["product"][0])
+        self.assertIn("Not enough stock", errors[3]["non_field_errors"][0])
+        self.assertFalse(Order.objects.exists())
+
+
+class KeysetPaginationTests(OrderFixturesMixin, TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        product = cls.create_product(cls.owner)
+        orders = [cls.create_order(cls.owner, [(product, 1)]) for _ in range(7)]
+        # Three orders share a timestamp, in the middle of the list.
+        tied = timezone.now() - timedelta(days=1)
+        for order, days in zip(orders, [0, 0, 0, 2, 3, 4, 5]):
+            order.created_at = tied - timedelta(days=days)
+        Order.objects.bulk_update(orders, ["created_at"])
+        cls.expected = list(
+            Order.objects.order_by("-created_at", "-id").values_list("pk", flat=True)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            body = self.client.get(url).json()
+            pages.append([order["id"] for order in body["results"]])
+            url = body[direction]
+        return pages
+
+    def test_pages_neither_skip_nor_repeat_tied_rows(self):
+        pages = self.walk("/api/orders/?page_size=2", "next")
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(list(chain.from_iterable(pages)), self.expected)
+
+    def test_previous_links_walk_back(self):
+        last_page_url = None
+        url = "/api/orders/?page_size=2"
+        while url:
+            last_page_url, url = url, self.client.get(url).json()["next"]
+
+        pages = self.walk(last_page_url, "previous")
+        self.assertEqual(list(chain.from_iterable(reversed(pages))), self.expected)
+
+    def test_page_query_does_not_depend_on_depth(self):
+        body = self.client.get("/api/orders/?page_size=5").json()
+        # The page of orders and their lines, whatever the cursor.
+        with self.assertNumQueries(2):
+            response = self.client.get(body["next"])
+        self.assertEqual(
+            [order["id"] for order in response.json()["results"]], self.expected[5:]
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in ("garbage", "cD1ub3Rqc29u", "cD1bMV0%3D"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f"/api/orders/?cursor={cursor}")
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(CreatedAtKeysetPagination, "max_page_size", 3):
+            response = self.client.get("/api/orders/?page_size=1000")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL.")
+    def test_search_results_page_by_rank_then_id(self):
+        for index in range(3):
+            self.create_product(self.owner, f"Lamp {index}", description="lamp lamp")
+        for index in range(3):
+            self.create_product(self.owner, f"Lamp {index}")
+
+        pages = self.walk(
+            "/api/products/?search=lamp&search_mode=fulltext&page_size=2", "next"
+        )
+        found = list(chain.from_iterable(pages))
+        self.assertEqual(len(found), 6)
+        self.assertEqual(found[:3], sorted(found[:3], reverse=True))
+        self.assertEqual(found[3:], sorted(found[3:], reverse=True))
+        self.assertEqual(
+            set(
+                Product.objects.filter(pk__in=found[:3]).values_list(
+                    "description", flat=True
+                )
+            ),
+            {"lamp lamp"},
+        )
+
+
+class AsyncViewTests(OrderFixturesMixin, TestCase):
+    """The async product viewset under the WSGI and the ASGI test handlers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.products = [
+            cls.create_product(cls.owner, f"Product {index}") for index in range(3)
+        ]
+
+    def setUp(self):
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"}
+
+    async def test_async_list_returns_the_same_page_under_both_handlers(self):
+        url = "/api/products/?page_size=2"
+        wsgi = await sync_to_async(self.client.get)(url, headers=self.headers)
+        asgi = await self.async_client.get(url, headers=self.headers)
+
+        self.assertEqual(wsgi.status_code, 200)
+        self.assertEqual(asgi.status_code, 200)
+        self.assertEqual(asgi.json(), wsgi.json())
+        self.assertEqual(
+            [product["id"] for product in asgi.json()["results"]],
+            [self.products[2].pk, self.products[1].pk],
+        )
+
+    async def test_sync_handlers_still_work(self):
+        response = await self.async_client.post(
+            "/api/products/",
+            {
+                "user": self.owner.pk,
+                "name": "Chair",
+                "price": "25.00",
+                "stock_quantity": 3,
+            },
+            content_type="application/json",
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+        response = await self.async_client.get(
+            f"/api/products/{response.json()['id']}/", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Chair")
+
+    async def test_exceptions_go_through_handle_exception(self):
+        cases = (
+            # Raised by the permission checks, run in a worker thread.
+            ("/api/products/", {}, 401),
+            # Raised by the async list handler itself.
+            ("/api/products/?cursor=garbage", self.headers, 404),
+            # Raised by a sync handler.
+            ("/api/products/999999/", self.headers, 404),
+        )
+        for url, headers, status in cases:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url, headers=headers)
+                self.assertEqual(response.status_code, status)
+                self.assertIn("detail", response.json())
+
+    async def test_streaming_content_iterates_off_the_event_loop_over_asgi(self):
+        lines = ["a\n", "b\n"]
+        iterator = iter(lines)
+        self.assertIs(streaming_content(RequestFactory().get("/"), iterator), iterator)
+
+        content = streaming_content(AsyncRequestFactory().get("/"), iter(lines))
+        self.assertEqual([line async for line in content], lines)
+
+
+class AdminSearchTests(OrderFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls.create_user("owner@example.com", is_staff=True)
+        cls.lamp = cls.create_product(cls.owner, "Desk Lamp")
+        cls.create_product(cls.create_user("rival@example.com"), "Lamp Shade")
+        cls.order = cls.create_order(cls.owner, [(cls.lamp, 1)])
+        # An email containing the order number must not match it.
+        other = cls.create_user(f"client{cls.order.pk}@example.com")
+        cls.other_order = cls.create_order(other, [(cls.lamp, 1)])
+
+    def search(self, model_admin, term):
+        request = RequestFactory().get("/admin/")
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            request, model_admin.model.objects.all(), term
+        )
+        self.assertFalse(may_have_duplicates)
+        return sorted(queryset.values_list("pk", flat=True))
+
+    def test_order_numbers_match_the_id_exactly(self):
+        model_admin = OrderAdmin(Order, AdminSite())
+
+        self.assertEqual(
+            self.search(model_admin, f" {self.order.pk} "), [self.order.pk]
+        )
+        self.assertEqual(
+            self.search(model_admin, f"client{self.order.pk}"), [self.other_order.pk]
+        )
+
+    def test_every_word_matches_a_field_or_the_related_user(self):
+        model_admin = ProductAdmin(Product, AdminSite())
+
+        self.assertEqual(len(self.search(model_admin, "lamp")), 2)
+        self.assertEqual(self.search(model_admin, "lamp owner@"), [self.lamp.pk])
+        self.assertEqual(self.search(model_admin, "shade owner@"), [])
+
+
+PIN_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "pins": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "replica-pins",
+    },
+}
+
+
+@override_settings(CACHES=PIN_CACHES, DB_REPLICA_PIN_CACHE="pins")
+class ReplicaRouterTests(OrderFixturesMixin, TestCase):
+    """Routing decisions, with the replica taken as usable unless said otherwise."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user("client@example.com")
+        cls.other = cls.create_user("other@example.com")
+
+    def setUp(self):
+        caches["pins"].clear()
+        usable = mock.patch.object(db_router, "replica_usable", return_value=True)
+        self.replica_usable = usable.start()
+        self.addCleanup(usable.stop)
+
+    def request(self, view, user=None):
+        """Run ``view`` behind the routing middleware and return its result."""
+        request = RequestFactory().get("/")
+        request.user = user or self.user
+        result = []
+
+        def get_response(request):
+            result.append(view(request))
+            return HttpResponse()
+
+        # The middleware leaves its state in the context, so give it a copy.
+        contextvars.copy_context().run(ReplicaRoutingMiddleware(get_response), request)
+        return result[0]
+
+    @staticmethod
+    def read_alias():
+        return router.db_for_read(Order)
+
+    def test_reads_use_the_primary_unless_the_view_opts_in(self):
+        self.assertEqual(self.read_alias(), "default")
+        self.assertEqual(self.request(lambda request: self.read_alias()), "default")
+
+    def test_a_write_moves_the_rest_of_the_request_to_the_primary(self):
+        def view(request):
+            use_replica(request.user)
+            before = self.read_alias()
+            self.assertEqual(router.db_for_write(Order), "default")
+            return before, self.read_alias(), use_replica(request.user)
+
+        self.assertEqual(self.request(view), ("replica", "default", False))
+
+    def test_users_who_wrote_are_pinned_to_the_primary(self):
+        def view(request):
+            return use_replica(request.user), self.read_alias()
+
+        self.request(lambda request: router.db_for_write(Order))
+
+        self.assertEqual(self.request(view), (False, "default"))
+        self.assertEqual(self.request(view, user=self.other), (True, "replica"))
+
+    def test_unusable_replica_is_skipped(self):
+        self.replica_usable.return_value = False
+
+        with replica_reads():
+            self.assertEqual(self.read_alias(), "default")
+        self.assertFalse(
+            self.request(lambda request: use_replica(request.user)),
+        )
+
+    def test_primary_reads_after_a_recent_write(self):
+        with replica_reads():
+            with primary_reads_after(time.time()):
+                recent = self.read_alias()
+            with primary_reads_after(time.time() - 60):
+                old = self.read_alias()
+            after = self.read_alias()
+
+        self.assertEqual((recent, old, after), ("default", "replica", "replica"))
+
+    def test_replica_is_usable_while_its_lag_is_small(self):
+        # replica_usable itself, not the stand-in the other tests use.
+        def usable(lag):
+            with (
+                mock.patch.dict(settings.DATABASES, replica),
+                mock.patch.dict(db_router._lag, checked_at=None),
+                mock.patch.object(db_router, "replica_lag", return_value=lag),
+            ):
+                return replica_usable()
+
+        replica = {"replica": settings.DATABASES["default"]}
+        self.assertIs(usable(0.5), True)
+        with self.assertLogs("shop_analytics.db_router", "WARNING"):
+            self.assertIs(usable(settings.DB_REPLICA_MAX_LAG + 1), False)
+        self.assertIs(usable(None), False)
+        self.assertIs(replica_usable(), False)
+
+    def test_pin_cache_must_be_shared_between_processes(self):
+        self.assertEqual(check_pin_cache(None), [])
+
+        with mock.patch.dict(
+            settings.DATABASES, {"replica": settings.DATABASES["default"]}
+        ):
+            errors = checks.run_checks(tags=[checks.Tags.caches])
+            self.assertEqual([error.id for error in errors], ["shop_analytics.E002"])
+            with override_settings(DB_REPLICA_PIN_CACHE="missing"):
+                self.assertEqual(
+                    [error.id for error in check_pin_cache(None)],
+                    ["shop_analytics.E001"],
+                )
+            shared = {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": "/var/tmp/pins",
+            }
+            with override_settings(CACHES={**PIN_CACHES, "pins": shared}):
+                self.assertEqual(check_pin_cache(None), [])
@@ -1,26 +1,82 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from shop_analytics.async_views import (
+    AsyncDispatchMixin,
+    AsyncListModelMixin,
+    streaming_content,
+)
+from shop_analytics.db_router import ReplicaReadMixin
+from shop_analytics.filters import created_between
+from shop_analytics.pagination import CreatedAtKeysetPagination, KeysetPagination
+from shop_analytics.search import SEARCH_MODES, search
+from .importers import import_orders
 from .models import Product, Order
-from .serializers import ProductSerializer, OrderSerializer
+from .serializers import (
+    ProductSerializer,
+    OrderSerializer,
+    OrderBulkTransitionSerializer,
+)
 from users.models import ClientDiscount
 from users.serializers import ClientDiscountSerializer
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    ReplicaReadMixin, AsyncDispatchMixin, AsyncListModelMixin, viewsets.ModelViewSet
+):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "search",
+                openapi.IN_QUERY,
+                description="Поиск по названию и описанию товара.",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "search_mode",
+                openapi.IN_QUERY,
+                description="Режим поиска: 'contains' — каждое слово по подстроке "
+                "(по умолчанию), 'substring' — по подстроке целиком, 'fulltext' — "
+                "полнотекстовый, результаты упорядочены по релевантности.",
+                type=openapi.TYPE_STRING,
+                enum=list(SEARCH_MODES),
+            ),
+        ]
+    )
+    async def list(self, request, *args, **kwargs):
+        return await super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        term = self.request.GET.get("search")
+        if term and self.action == "list":
+            search_mode = self.request.GET.get("search_mode", "contains")
+            queryset = search(queryset, ["name", "description"], term, search_mode)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(
+    ReplicaReadMixin, AsyncDispatchMixin, AsyncListModelMixin, viewsets.ModelViewSet
+):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -53,39 +109,99 @@ class OrderViewSet(viewsets.ModelViewSet):
             ),
         ]
     )
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    async def list(self, request, *args, **kwargs):
+        return await super().list(request, *args, **kwargs)
 
     def get_queryset(self):
         user = self.request.user
 
-        if user.is_staff:
-            queryset = Order.objects.all()
-        else:
-            queryset = Order.objects.filter(user=user)
+        queryset = Order.objects.prefetch_related("products")
+        if not user.is_staff:
+            queryset = queryset.filter(user=user)
 
         status = self.request.GET.get("status")
         user_id = self.request.GET.get("user_id")
-        date_from = self.request.GET.get("date_from")
-        date_to = self.request.GET.get("date_to")
 
         if status:
-            queryset = queryset.filter(status__iexact=status)
+            # Statuses are stored lowercase; an exact match keeps the
+            # (status, created_at) index usable where ``iexact`` would not.
+            queryset = queryset.filter(status=status.lower())
 
         if user_id and user.is_staff:
             queryset = queryset.filter(user_id=user_id)
 
-        if date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-
-        if date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
-
-        return queryset
+        return queryset.filter(**created_between(self.request.GET))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @swagger_auto_schema(
+        request_body=OrderBulkTransitionSerializer,
+        operation_description="Перевести несколько заказов в указанный статус. "
+        "Списание остатков для подтверждаемых заказов выполняется одной транзакцией; "
+        "результат возвращается по каждому заказу.",
+    )
+    @action(detail=False, methods=["post"], url_path="bulk-transition")
+    def bulk_transition(self, request):
+        serializer = OrderBulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        target_status = serializer.validated_data["status"]
+
+        orders = Order.objects.filter(pk__in=ids)
+        if not request.user.is_staff:
+            orders = orders.filter(user=request.user)
+        errors = orders.transition_to(target_status)
+
+        results = []
+        for order_id in dict.fromkeys(ids):
+            if order_id not in errors:
+                results.append(
+                    {"id": order_id, "success": False, "error": "Order not found."}
+                )
+            elif errors[order_id]:
+                results.append(
+                    {"id": order_id, "success": False, "error": errors[order_id]}
+                )
+            else:
+                results.append(
+                    {"id": order_id, "success": True, "status": target_status}
+                )
+        return Response({"results": results})
+
+    @swagger_auto_schema(
+        operation_description="Потоковый импорт заказов в формате NDJSON: одна строка — "
+        "один заказ с позициями. Ответ — NDJSON с ошибками по строкам и прогрессом "
+        "после каждого пакета.",
+        manual_parameters=[
+            openapi.Parameter(
+                "chunk_size",
+                openapi.IN_QUERY,
+                description="Количество строк в одном пакете (по умолчанию 500, "
+                "не больше IMPORT_MAX_CHUNK_SIZE — 5000).",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+    )
+    def import_ndjson(self, request):
+        try:
+            chunk_size = int(request.GET.get("chunk_size", 500))
+        except ValueError:
+            return Response({"error": "chunk_size must be an integer."}, status=400)
+        chunk_size = min(max(1, chunk_size), settings.IMPORT_MAX_CHUNK_SIZE)
+
+        events = import_orders(request.stream or [], chunk_size=chunk_size)
+        return StreamingHttpResponse(
+            streaming_content(request, (json.dumps(event) + "\n" for event in events)),
+            content_type="application/x-ndjson",
+        )
+
 
 class ClientDiscountViewSet(viewsets.ModelViewSet):
     queryset = ClientDiscount.objects.all()
@@ -0,0 +1,172 @@
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+EXPORT_HEADERS = [
+    "Order ID",
+    "Date Created",
+    "Status",
+    "Client Email",
+    "Client Name",
+    "Lines",
+    "Items",
+    "Subtotal",
+    "Discounts",
+    "VAT",
+    "Delivery",
+    "Total (KZT)",
+]
+
+# Characters XML 1.0 does not allow, which would make the worksheet unreadable.
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def export_rows(orders, chunk_size=2000):
+    """Yield one row of ``EXPORT_HEADERS`` values per order in ``orders``.
+
+    Orders are read with a server-side cursor in chunks of ``chunk_size``, so
+    memory use does not depend on the size of the period.
+    """
+    rows = (
+        orders.order_by("created_at", "id")
+        .annotate(line_count=Count("products"), item_count=Sum("products__quantity"))
+        .values_list(
+            "id",
+            "created_at",
+            "status",
+            "user__email",
+            "user__full_name",
+            "line_count",
+            "item_count",
+            "subtotal",
+            "discount_total",
+            "vat_amount",
+            "delivery_amount",
+            "total",
+        )
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        order_id, created_at, status, email, full_name, lines, items, *totals = row
+        yield (
+            order_id,
+            timezone.localtime(created_at).strftime("%Y-%m-%d %H:%M:%S"),
+            status,
+            email,
+            full_name or "",
+            lines,
+            items or 0,
+            *totals,
+        )
+
+
+class _Echo:
+    """File-like object whose ``write`` hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADERS).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+class _ChunkBuffer:
+    """Write-only sink that lets a generator drain what ``zipfile`` wrote."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Orders" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = escape(_INVALID_XML_CHARS.sub("", str(value)))
+            cells.append(f'<c t="inlineStr"><is><t>{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+def stream_xlsx(rows, rows_per_chunk=500):
+    """Yield an XLSX workbook holding ``rows`` as it is being zipped.
+
+    The worksheet uses inline strings, so no shared string table has to be
+    held in memory; every ``rows_per_chunk`` rows the compressed bytes
+    written so far are handed to the caller.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                b'spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(EXPORT_HEADERS).encode())
+            for count, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % rows_per_chunk == 0:
+                    yield buffer.drain()
+            sheet.write(b"</sheetData></worksheet>")
+        yield buffer.drain()
+    yield buffer.drain()
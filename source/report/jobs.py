@@ -0,0 +1,100 @@
+import signal
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ReportJob
+from .rendering import build_report_pdf
+from .services import SalesReport
+
+Status = ReportJob.StatusChoices
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout("Report rendering timed out.")
+
+
+def claim_jobs(limit):
+    """Mark up to ``limit`` pending jobs as running and return their ids.
+
+    Rows are locked with ``SKIP LOCKED``, so several workers can poll the same
+    table without handing out a job twice.
+    """
+    with transaction.atomic():
+        job_ids = list(
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=Status.PENDING)
+            .order_by("created_at", "id")
+            .values_list("pk", flat=True)[:limit]
+        )
+        ReportJob.objects.filter(pk__in=job_ids).update(
+            status=Status.RUNNING,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+    return job_ids
+
+
+def recover_stale_jobs(timeout, max_attempts):
+    """Requeue jobs left running past ``timeout`` seconds by a dead worker.
+
+    Jobs that already used ``max_attempts`` are marked as failed instead.
+    Returns the number of jobs touched.
+    """
+    stale = ReportJob.objects.filter(
+        status=Status.RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=timeout * 2),
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Status.FAILED,
+        error="Worker stopped before the report was rendered.",
+        finished_at=timezone.now(),
+    )
+    return failed + stale.update(status=Status.PENDING, started_at=None)
+
+
+def run_job(job_id, timeout):
+    """Render the PDF of a claimed job and store the outcome.
+
+    Runs inside a worker process; ``SIGALRM`` aborts rendering after
+    ``timeout`` seconds so a single huge report cannot hold a slot forever.
+    """
+    job = ReportJob.objects.get(pk=job_id)
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.alarm(timeout)
+    try:
+        report = SalesReport(job.start_date, job.end_date)
+        context = report.get_context()
+        if context["total_orders_count"] > settings.REPORT_PDF_MAX_ROWS:
+            mode = "summary"
+        else:
+            mode = "chunked"
+        with build_report_pdf(report, context, mode).render() as pdf_file:
+            job.file.save(
+                f"sales_report_{job.start_date}_to_{job.end_date}.pdf",
+                File(pdf_file),
+                save=False,
+            )
+        job.status = Status.DONE
+    except Exception as exc:  # noqa: BLE001 - any error fails the job
+        job.status = Status.FAILED
+        job.error = str(exc) or exc.__class__.__name__
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+    ReportJob.objects.filter(pk=job.pk, status=Status.RUNNING).update(
+        status=job.status,
+        file=job.file.name or "",
+        error=job.error,
+        finished_at=timezone.now(),
+    )
+    return job.status
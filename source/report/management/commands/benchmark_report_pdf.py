@@ -0,0 +1,111 @@
+import os
+import resource
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+from weasyprint import HTML
+
+from analytics.models import Order
+from report.rendering import SalesReportPdf, get_stylesheet
+
+
+def synthetic_rows(count):
+    labels = dict(Order.StatusChoices.choices)
+    start = timezone.make_aware(datetime(2024, 1, 1))
+    for index in range(count):
+        status = "shipped" if index % 3 else "confirmed"
+        yield {
+            "created_at": start + timedelta(minutes=index),
+            "status": status,
+            "status_label": labels[status],
+            "total": Decimal(1000 + index % 9000) / 100,
+            "user__full_name": f"Customer {index % 5000}",
+        }
+
+
+def synthetic_chunks(count, size):
+    rows = synthetic_rows(count)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Render a sales report PDF over synthetic orders and print the time taken "
+        "and the peak memory of this process. Run one mode per invocation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--orders",
+            type=int,
+            default=100000,
+            help="Number of synthetic orders in the period (default: 100000).",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["chunked", "summary", "single"],
+            default="chunked",
+            help="chunked and summary are the report modes; single renders the "
+            "full order table as one document for comparison.",
+        )
+        parser.add_argument(
+            "--chunk-rows",
+            type=int,
+            default=1000,
+            help="Rows per rendered batch in chunked mode (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        count = options["orders"]
+        mode = options["mode"]
+        context = {
+            "start_date": date(2024, 1, 1),
+            "end_date": date(2024, 3, 31),
+            "report_date": timezone.now().strftime("%Y-%m-%d"),
+            "total_revenue": Decimal(0),
+            "total_orders_count": count,
+            "top_customers": [],
+            "most_popular_product": None,
+            "all_orders": list(synthetic_rows(min(count, 100))),
+            "orders_omitted": max(count - 100, 0),
+        }
+        get_stylesheet()
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as target:
+            if mode == "single":
+                _, stylesheet = get_stylesheet()
+                html_string = render_to_string(
+                    "index.html",
+                    {
+                        **context,
+                        "all_orders": list(synthetic_rows(count)),
+                        "orders_omitted": 0,
+                    },
+                )
+                HTML(string=html_string).write_pdf(
+                    target.name, stylesheets=[stylesheet]
+                )
+            elif mode == "summary":
+                SalesReportPdf(context).write_pdf(target.name)
+            else:
+                SalesReportPdf(
+                    context,
+                    order_chunks=lambda: synthetic_chunks(count, options["chunk_rows"]),
+                ).write_pdf(target.name)
+
+            elapsed = time.perf_counter() - started
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(
+                f"{mode}: {count} orders, {os.path.getsize(target.name) / 1024:.0f} KiB PDF in "
+                f"{elapsed:.1f}s; peak RSS {peak / 1024:.0f} MiB "
+                f"({(peak - baseline) / 1024:.0f} MiB above baseline)."
+            )
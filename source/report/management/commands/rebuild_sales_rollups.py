@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from dateutil.parser import parse
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from analytics.models import Order
+from report.models import RolledUpOrder, RolledUpOrderProduct
+from report.rollups import ROLLUP_MODELS, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollup tables from orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start-date",
+            help="First day to rebuild in YYYY-MM-DD format (default: first order).",
+        )
+        parser.add_argument(
+            "--end-date",
+            help="Last day to rebuild in YYYY-MM-DD format (default: last order).",
+        )
+        parser.add_argument(
+            "--days-per-batch",
+            type=int,
+            default=31,
+            help="Number of days recomputed per transaction (default: 31).",
+        )
+
+    def handle(self, *args, **options):
+        bounds = Order.objects.aggregate(
+            first=Min("created_at"), last=Max("created_at")
+        )
+        try:
+            start_date = (
+                parse(options["start_date"]).date()
+                if options["start_date"]
+                else bounds["first"] and timezone.localtime(bounds["first"]).date()
+            )
+            end_date = (
+                parse(options["end_date"]).date()
+                if options["end_date"]
+                else bounds["last"] and timezone.localtime(bounds["last"]).date()
+            )
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD.")
+
+        if not options["start_date"] and not options["end_date"]:
+            # A full rebuild also drops rows left outside the order history.
+            for model in (*ROLLUP_MODELS, RolledUpOrder):
+                stale = model.objects.all()
+                if start_date:
+                    stale = stale.exclude(date__range=[start_date, end_date])
+                stale.delete()
+            RolledUpOrderProduct.objects.exclude(
+                order_id__in=RolledUpOrder.objects.values("order_id")
+            ).delete()
+        if not start_date or not end_date:
+            self.stdout.write(self.style.SUCCESS("No orders to roll up."))
+            return
+
+        batch = timedelta(days=options["days_per_batch"])
+        day = start_date
+        while day <= end_date:
+            last_day = min(day + batch - timedelta(days=1), end_date)
+            rebuild_sales_rollups(
+                day + timedelta(days=offset)
+                for offset in range((last_day - day).days + 1)
+            )
+            self.stdout.write(f"Rebuilt rollups from {day} to {last_day}.")
+            day = last_day + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups up to {end_date}."))
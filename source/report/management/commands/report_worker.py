@@ -0,0 +1,103 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from report.jobs import claim_jobs, recover_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Render queued PDF report jobs in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.REPORT_WORKER_CONCURRENCY,
+            help="Number of reports rendered in parallel.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=settings.REPORT_JOB_TIMEOUT,
+            help="Seconds a single report may render before it is aborted.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.REPORT_WORKER_POLL_INTERVAL,
+            help="Seconds to wait between checks for new jobs.",
+        )
+        parser.add_argument(
+            "--max-tasks-per-child",
+            type=int,
+            default=settings.REPORT_WORKER_MAX_TASKS_PER_CHILD,
+            help="Restart a worker process after this many reports to cap memory.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling forever.",
+        )
+
+    def make_pool(self, options):
+        # Worker processes are spawned rather than forked so they never share
+        # this process's database connections.
+        return ProcessPoolExecutor(
+            max_workers=options["concurrency"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+            max_tasks_per_child=options["max_tasks_per_child"],
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        timeout = options["timeout"]
+        pool = self.make_pool(options)
+        running = {}
+        self.stdout.write(f"Rendering reports with {concurrency} processes.")
+        try:
+            while True:
+                close_old_connections()
+                recovered = recover_stale_jobs(
+                    timeout, settings.REPORT_JOB_MAX_ATTEMPTS
+                )
+                if recovered:
+                    self.stdout.write(f"Requeued or failed {recovered} stale jobs.")
+                for job_id in claim_jobs(concurrency - len(running)):
+                    running[pool.submit(run_job, job_id, timeout)] = job_id
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait(
+                    running,
+                    timeout=options["poll_interval"],
+                    return_when=FIRST_COMPLETED,
+                )
+                broken = False
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.stdout.write(f"Job {job_id}: {future.result()}.")
+                    except BrokenProcessPool:
+                        # The job stays running and is requeued once it goes stale.
+                        self.stderr.write(f"Job {job_id}: worker process died.")
+                        broken = True
+                if broken:
+                    # Every job of a broken pool fails the same way; drop them all.
+                    for job_id in running.values():
+                        self.stderr.write(f"Job {job_id}: worker process died.")
+                    running.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.make_pool(options)
+        finally:
+            pool.shutdown(cancel_futures=True)
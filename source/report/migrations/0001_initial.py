@@ -0,0 +1,156 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("analytics", "0004_order_order_created_id_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True, verbose_name="Date")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Revenue (KZT)",
+                    ),
+                ),
+                (
+                    "orders_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Orders"),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="Items Sold"),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Sales",
+                "verbose_name_plural": "Daily Sales",
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyCustomerSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Date")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Revenue (KZT)",
+                    ),
+                ),
+                (
+                    "orders_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Orders"),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="Items Sold"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Client",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Customer Sales",
+                "verbose_name_plural": "Daily Customer Sales",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "user"), name="daily_customer_sales_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Date")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Line amounts after the product discount, before order-level discounts.",
+                        max_digits=14,
+                        verbose_name="Line Revenue (KZT)",
+                    ),
+                ),
+                (
+                    "orders_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Orders"),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Quantity Sold"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="analytics.product",
+                        verbose_name="Product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Product Sales",
+                "verbose_name_plural": "Daily Product Sales",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "product"), name="daily_product_sales_unique"
+                    )
+                ],
+            },
+        ),
+    ]
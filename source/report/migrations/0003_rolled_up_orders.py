@@ -0,0 +1,116 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("report", "0002_reportjob"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailycustomersales",
+            name="orders_count",
+            field=models.IntegerField(default=0, verbose_name="Orders"),
+        ),
+        migrations.AlterField(
+            model_name="dailycustomersales",
+            name="quantity",
+            field=models.IntegerField(default=0, verbose_name="Items Sold"),
+        ),
+        migrations.AlterField(
+            model_name="dailyproductsales",
+            name="orders_count",
+            field=models.IntegerField(default=0, verbose_name="Orders"),
+        ),
+        migrations.AlterField(
+            model_name="dailyproductsales",
+            name="quantity",
+            field=models.IntegerField(default=0, verbose_name="Quantity Sold"),
+        ),
+        migrations.AlterField(
+            model_name="dailysales",
+            name="orders_count",
+            field=models.IntegerField(default=0, verbose_name="Orders"),
+        ),
+        migrations.AlterField(
+            model_name="dailysales",
+            name="quantity",
+            field=models.IntegerField(default=0, verbose_name="Items Sold"),
+        ),
+        migrations.CreateModel(
+            name="RolledUpOrder",
+            fields=[
+                (
+                    "order_id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="Order"
+                    ),
+                ),
+                ("date", models.DateField(null=True, verbose_name="Date")),
+                ("user_id", models.BigIntegerField(null=True, verbose_name="Client")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Revenue (KZT)",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="Items Sold"),
+                ),
+            ],
+            options={
+                "verbose_name": "Rolled Up Order",
+                "verbose_name_plural": "Rolled Up Orders",
+                "indexes": [
+                    models.Index(fields=["date"], name="rolled_up_order_date_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="RolledUpOrderProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order_id", models.BigIntegerField(verbose_name="Order")),
+                ("product_id", models.BigIntegerField(verbose_name="Product")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Line Revenue (KZT)",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Quantity Sold"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Rolled Up Order Product",
+                "verbose_name_plural": "Rolled Up Order Products",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("order_id", "product_id"),
+                        name="rolled_up_order_product_unique",
+                    )
+                ],
+            },
+        ),
+    ]
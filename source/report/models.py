@@ -1,3 +1,164 @@
+from django.contrib.auth import get_user_model
 from django.db import models
 
-# Create your models here.
+from analytics.models import Product
+
+User = get_user_model()
+
+
+# The counts of the rollup tables are signed: refreshes add negative
+# differences to them, and PostgreSQL checks the row proposed by an upsert
+# against the table constraints before it finds the existing row.
+class DailySales(models.Model):
+    date = models.DateField(unique=True, verbose_name="Date")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Revenue (KZT)"
+    )
+    orders_count = models.IntegerField(default=0, verbose_name="Orders")
+    quantity = models.IntegerField(default=0, verbose_name="Items Sold")
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+    class Meta:
+        verbose_name = "Daily Sales"
+        verbose_name_plural = "Daily Sales"
+
+
+class DailyCustomerSales(models.Model):
+    date = models.DateField(verbose_name="Date")
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", verbose_name="Client"
+    )
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Revenue (KZT)"
+    )
+    orders_count = models.IntegerField(default=0, verbose_name="Orders")
+    quantity = models.IntegerField(default=0, verbose_name="Items Sold")
+
+    def __str__(self):
+        return f"Sales to {self.user_id} on {self.date}"
+
+    class Meta:
+        verbose_name = "Daily Customer Sales"
+        verbose_name_plural = "Daily Customer Sales"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["date", "user"], name="daily_customer_sales_unique"
+            ),
+        )
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField(verbose_name="Date")
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="+", verbose_name="Product"
+    )
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Line Revenue (KZT)",
+        help_text="Line amounts after the product discount, before order-level discounts.",
+    )
+    orders_count = models.IntegerField(default=0, verbose_name="Orders")
+    quantity = models.IntegerField(default=0, verbose_name="Quantity Sold")
+
+    def __str__(self):
+        return f"Sales of {self.product_id} on {self.date}"
+
+    class Meta:
+        verbose_name = "Daily Product Sales"
+        verbose_name_plural = "Daily Product Sales"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["date", "product"], name="daily_product_sales_unique"
+            ),
+        )
+
+
+class RolledUpOrder(models.Model):
+    """What one confirmed or shipped order currently adds to the daily rollups.
+
+    Kept without foreign keys so the row outlives a deleted order until its
+    contribution has been taken back out of the rollups.
+    """
+
+    order_id = models.BigIntegerField(primary_key=True, verbose_name="Order")
+    date = models.DateField(null=True, verbose_name="Date")
+    user_id = models.BigIntegerField(null=True, verbose_name="Client")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Revenue (KZT)"
+    )
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Items Sold")
+
+    def __str__(self):
+        return f"Rolled up order {self.order_id}"
+
+    class Meta:
+        verbose_name = "Rolled Up Order"
+        verbose_name_plural = "Rolled Up Orders"
+        indexes = (models.Index(fields=["date"], name="rolled_up_order_date_idx"),)
+
+
+class RolledUpOrderProduct(models.Model):
+    """What one product of a rolled up order adds to the daily product rollup."""
+
+    order_id = models.BigIntegerField(verbose_name="Order")
+    product_id = models.BigIntegerField(verbose_name="Product")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Line Revenue (KZT)"
+    )
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Quantity Sold")
+
+    def __str__(self):
+        return f"Rolled up product {self.product_id} of order {self.order_id}"
+
+    class Meta:
+        verbose_name = "Rolled Up Order Product"
+        verbose_name_plural = "Rolled Up Order Products"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["order_id", "product_id"],
+                name="rolled_up_order_product_unique",
+            ),
+        )
+
+
+class ReportJob(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="report_jobs",
+        verbose_name="Requested By",
+    )
+    start_date = models.DateField(verbose_name="Start Date")
+    end_date = models.DateField(verbose_name="End Date")
+    status = models.CharField(
+        max_length=20,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+        verbose_name="Status",
+    )
+    file = models.FileField(upload_to="reports/", blank=True, verbose_name="File")
+    error = models.TextField(blank=True, verbose_name="Error")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date Created")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished")
+
+    def __str__(self):
+        return f"Report job {self.id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Report Job"
+        verbose_name_plural = "Report Jobs"
+        indexes = (
+            models.Index(fields=["status", "created_at"], name="report_job_status_idx"),
+        )
@@ -0,0 +1,317 @@
+import hashlib
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import render_to_string
+from pypdf import PdfWriter
+from weasyprint import CSS, HTML
+
+from shop_analytics.db_router import replica_reads
+
+from .services import SalesReport
+
+CSS_PATH = "css/output.css"
+
+# (path, mtime, digest, parsed stylesheet) of the compiled CSS in this process.
+_stylesheet = None
+_pdf_cache = None
+_render_executor = None
+
+
+def get_stylesheet():
+    """Return ``(digest, CSS)`` for the compiled stylesheet.
+
+    The file is located and parsed once per process and only parsed again
+    when its modification time changes. Raises ``FileNotFoundError`` when the
+    stylesheet is missing.
+    """
+    global _stylesheet
+    if _stylesheet is not None:
+        path, mtime, digest, stylesheet = _stylesheet
+        try:
+            if os.stat(path).st_mtime_ns == mtime:
+                return digest, stylesheet
+        except FileNotFoundError:
+            pass
+
+    path = finders.find(CSS_PATH)
+    if not path:
+        raise FileNotFoundError(f"CSS file not found at static/{CSS_PATH}.")
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, "rb") as css_file:
+        digest = hashlib.sha256(css_file.read()).hexdigest()
+    _stylesheet = (path, mtime, digest, CSS(filename=path))
+    return digest, _stylesheet[3]
+
+
+class PdfCache:
+    """Rendered PDFs on disk, named by content hash.
+
+    Reading an entry refreshes its modification time, and writes evict the
+    least recently used files once the directory grows past ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def open(self, key):
+        """Return the entry ``key`` opened for reading, or ``None``."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+            return open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+    def store(self, key, write):
+        """Keep the file ``write(path)`` creates as ``key`` and return it opened.
+
+        Files larger than ``max_bytes`` are returned without being kept.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if os.path.getsize(tmp_path) > self.max_bytes:
+            return open_temporary(tmp_path)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+        return self.open(key)
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def get_pdf_cache():
+    global _pdf_cache
+    if _pdf_cache is None and settings.REPORT_PDF_CACHE_MAX_BYTES > 0:
+        _pdf_cache = PdfCache(
+            settings.REPORT_PDF_CACHE_DIR, settings.REPORT_PDF_CACHE_MAX_BYTES
+        )
+    return _pdf_cache
+
+
+def render_sales_html(context):
+    return render_to_string("index.html", context)
+
+
+def pdf_digest(html_string, base_url=None, more_html=()):
+    """Hash everything that determines the PDF rendered from ``html_string``.
+
+    ``more_html`` iterates over the documents rendered after it into the same
+    PDF; they are hashed one at a time.
+    """
+    css_digest, _ = get_stylesheet()
+    content = hashlib.sha256()
+    for part in itertools.chain((css_digest, base_url or "", html_string), more_html):
+        content.update(part.encode())
+        content.update(b"\0")
+    return content.hexdigest()
+
+
+def open_temporary(path):
+    """Open the file at ``path`` and delete it.
+
+    The returned file stays readable until it is closed.
+    """
+    try:
+        return open(path, "rb")
+    finally:
+        os.remove(path)
+
+
+def temporary_pdf(write):
+    """Return the file ``write(path)`` creates, opened and already deleted."""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        write(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return open_temporary(path)
+
+
+def cached_pdf(digest, write):
+    """Return the PDF stored under ``digest`` as an open file.
+
+    On a miss ``write(path)`` renders it into ``path``. Without a PDF cache
+    the file is temporary and disappears once it is closed.
+    """
+    cache = get_pdf_cache()
+    if cache is None:
+        return temporary_pdf(write)
+    return cache.open(digest) or cache.store(digest, write)
+
+
+def merge_pdfs(paths, target):
+    """Join the PDF files at ``paths`` into the file ``target``, keeping the
+    first one's metadata.
+
+    The merged document is serialized straight into ``target``, so it is
+    never held in memory as a whole next to the parsed pages.
+    """
+    writer = PdfWriter(clone_from=paths[0])
+    for path in paths[1:]:
+        writer.append(path)
+    writer.write(target)
+
+
+class SalesReportPdf:
+    """PDF of a sales report, either as a summary or with its full order table.
+
+    In summary mode the document is ``index.html`` with the capped order
+    table of the context. When ``order_chunks`` is given, the summary is laid
+    out without the table and every chunk of rows is rendered as a document
+    of its own and written to a temporary file; the files are then merged
+    into the target file. Only one chunk is laid out at a time, so peak
+    memory is that of one chunk plus the pages being merged.
+    ``REPORT_PDF_MAX_ROWS`` caps the size of the PDF.
+
+    ``order_chunks`` is a callable returning an iterable of row lists. The
+    digest, used as ETag and cache key, hashes the summary and every chunk's
+    HTML with the stylesheet, so it only changes with the rendered content;
+    chunks are rendered to HTML once for it and again on a cache miss.
+    """
+
+    def __init__(self, context, order_chunks=None, base_url=None):
+        self.order_chunks = order_chunks
+        self.base_url = base_url
+        self.html_string = render_sales_html(
+            {**context, "detail_in_chunks": order_chunks is not None}
+        )
+        self.digest = pdf_digest(self.html_string, base_url, self._chunk_html())
+
+    def _chunk_html(self):
+        """Yield the HTML of every order table chunk, in document order."""
+        if self.order_chunks is None:
+            return
+        first_chunk = True
+        for rows in self.order_chunks():
+            yield render_to_string(
+                "orders_chunk.html", {"orders": rows, "first_chunk": first_chunk}
+            )
+            first_chunk = False
+        if first_chunk:
+            yield render_to_string(
+                "orders_chunk.html", {"orders": [], "first_chunk": True}
+            )
+
+    def _render_document(self, html_string, stylesheet):
+        return HTML(string=html_string, base_url=self.base_url).render(
+            stylesheets=[stylesheet]
+        )
+
+    def write_pdf(self, target):
+        """Render the PDF into the file ``target``, bypassing the PDF cache."""
+        _, stylesheet = get_stylesheet()
+        if self.order_chunks is None:
+            self._render_document(self.html_string, stylesheet).write_pdf(target)
+            return
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+
+            def write(html_string):
+                path = os.path.join(directory, f"{len(paths)}.pdf")
+                self._render_document(html_string, stylesheet).write_pdf(path)
+                paths.append(path)
+
+            write(self.html_string)
+            for html_string in self._chunk_html():
+                write(html_string)
+            merge_pdfs(paths, target)
+
+    def cached(self):
+        """Return the PDF file from the PDF cache, or ``None`` on a miss."""
+        cache = get_pdf_cache()
+        return cache.open(self.digest) if cache else None
+
+    def render(self):
+        """Return the PDF as an open file, rendering it on a cache miss."""
+        return cached_pdf(self.digest, self.write_pdf)
+
+
+def build_report_pdf(report, context, mode="chunked", base_url=None):
+    """Return the ``SalesReportPdf`` of ``report`` in ``mode``.
+
+    ``context`` must come from ``report.get_context()``.
+    """
+    if mode == "summary":
+        return SalesReportPdf(context, base_url=base_url)
+    return SalesReportPdf(
+        context,
+        order_chunks=lambda: report.iter_order_chunks(settings.REPORT_PDF_CHUNK_ROWS),
+        base_url=base_url,
+    )
+
+
+def render_report_pdf(
+    start_date, end_date, mode="chunked", base_url=None, replica=False
+):
+    """Build and render the sales report PDF of a period into a file.
+
+    Entry point for ``get_render_executor()``, which only accepts picklable
+    arguments; the figures are read again in the rendering process, from the
+    read replica if ``replica``. Returns the path of the file, which the
+    caller opens and then deletes.
+    """
+    with replica_reads(replica):
+        report = SalesReport(start_date, end_date)
+        context = report.get_context()
+        pdf = build_report_pdf(report, context, mode, base_url)
+        with pdf.render() as pdf_file:
+            fd, path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as target:
+                shutil.copyfileobj(pdf_file, target)
+        return path
+
+
+def get_render_executor():
+    """Process pool rendering PDFs outside an ASGI worker's event loop.
+
+    ``REPORT_RENDER_PROCESSES`` processes are spawned on first use, so they
+    never share this process's database connections.
+    """
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = ProcessPoolExecutor(
+            max_workers=settings.REPORT_RENDER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+    return _render_executor
@@ -0,0 +1,253 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.utils import timezone
+
+from analytics.models import Order, OrderProduct, _money
+from shop_analytics.filters import day_start
+
+from .models import (
+    DailyCustomerSales,
+    DailyProductSales,
+    DailySales,
+    RolledUpOrder,
+    RolledUpOrderProduct,
+)
+
+SALES_STATUSES = list(Order.SALES_STATUSES)
+ROLLUP_MODELS = (DailySales, DailyCustomerSales, DailyProductSales)
+# Each rollup model with the fields its rows are unique on.
+ROLLUP_KEYS = (
+    (DailySales, ("date",)),
+    (DailyCustomerSales, ("date", "user_id")),
+    (DailyProductSales, ("date", "product_id")),
+)
+ROLLUP_TOTALS = ("revenue", "orders_count", "quantity")
+
+
+def _periods(days):
+    """Collapse sorted ``days`` into half-open ``[start, end)`` datetime ranges."""
+    periods = []
+    for day in days:
+        if periods and periods[-1][1] == day:
+            periods[-1][1] = day + timedelta(days=1)
+        else:
+            periods.append([day, day + timedelta(days=1)])
+    return [(day_start(start), day_start(end)) for start, end in periods]
+
+
+def _contributions(orders, using):
+    """Return what the confirmed and shipped ``orders`` add to the rollups.
+
+    Returns their ``RolledUpOrder`` rows keyed by order pk and the
+    ``RolledUpOrderProduct`` rows of their lines, one per product.
+    """
+    orders = orders.filter(status__in=SALES_STATUSES)
+    rolled = {
+        pk: RolledUpOrder(
+            order_id=pk,
+            date=timezone.localtime(created_at).date(),
+            user_id=user_id,
+            revenue=total,
+        )
+        for pk, created_at, user_id, total in orders.values_list(
+            "pk", "created_at", "user_id", "total"
+        ).iterator()
+    }
+
+    money = DecimalField(max_digits=20, decimal_places=6)
+    lines = (
+        OrderProduct.objects.using(using)
+        .filter(order__in=orders.values("pk"))
+        .values("order_id", "product_id")
+        .annotate(
+            quantity_sold=Sum("quantity"),
+            line_revenue=Sum(
+                F("quantity")
+                * F("product__price")
+                * (
+                    Value(Decimal(1))
+                    - F("product__discount_percentage") * Value(Decimal("0.01"))
+                ),
+                output_field=money,
+            ),
+        )
+        .order_by()
+    )
+    products = []
+    for row in lines.iterator():
+        order = rolled.get(row["order_id"])
+        if order is None:
+            # Confirmed between the two queries; its own refresh counts it.
+            continue
+        order.quantity += row["quantity_sold"]
+        products.append(
+            RolledUpOrderProduct(
+                order_id=row["order_id"],
+                product_id=row["product_id"],
+                quantity=row["quantity_sold"],
+                revenue=_money(row["line_revenue"]),
+            )
+        )
+    return rolled, products
+
+
+def _add(totals, rolled, products, sign=1):
+    """Add ``sign`` times what ``rolled`` orders contribute to ``totals``.
+
+    ``totals`` holds one mapping per rollup model, from the key of a row to
+    its revenue, orders count and quantity.
+    """
+    daily, customers, product_totals = totals
+    for order in rolled.values():
+        for row in (daily[(order.date,)], customers[order.date, order.user_id]):
+            row[0] += sign * order.revenue
+            row[1] += sign
+            row[2] += sign * order.quantity
+    for line in products:
+        row = product_totals[rolled[line.order_id].date, line.product_id]
+        row[0] += sign * line.revenue
+        row[1] += sign
+        row[2] += sign * line.quantity
+
+
+def _totals():
+    return tuple(defaultdict(lambda: [Decimal(0), 0, 0]) for _ in ROLLUP_KEYS)
+
+
+def _increment(model, key_fields, deltas, using):
+    """Add ``deltas`` to the rows of ``model`` with matching keys.
+
+    Missing rows are inserted and the increments are applied by the upsert
+    itself, so concurrent refreshes of one row add up instead of overwriting
+    each other. Rows left without orders are deleted.
+    """
+    deltas = sorted((key, values) for key, values in deltas.items() if any(values))
+    if not deltas:
+        return
+
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    keys = [quote(model._meta.get_field(name).column) for name in key_fields]
+    totals = [quote(model._meta.get_field(name).column) for name in ROLLUP_TOTALS]
+    row = "({})".format(", ".join(["%s"] * (len(keys) + len(totals))))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(keys + totals)}) "
+            f"VALUES {', '.join([row] * len(deltas))} "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+            + ", ".join(
+                f"{column} = {table}.{column} + EXCLUDED.{column}" for column in totals
+            ),
+            [value for key, values in deltas for value in (*key, *values)],
+        )
+
+    emptied = {key[0] for key, values in deltas if values[1] < 0}
+    if emptied:
+        model.objects.using(using).filter(date__in=emptied, orders_count=0).delete()
+
+
+def refresh_sales_rollups(order_ids, batch_size=1000):
+    """Apply the changes of ``order_ids`` to the rollup rows.
+
+    Each order's current contribution is compared with the one recorded in
+    ``RolledUpOrder`` and only the difference is added to the rollups, so the
+    cost depends on the changed orders rather than on how busy their days are.
+    Concurrent refreshes only wait for each other on the same orders.
+    """
+    order_ids = sorted(set(order_ids))
+    using = router.db_for_write(DailySales)
+    for start in range(0, len(order_ids), batch_size):
+        with transaction.atomic(using=using):
+            _refresh_orders(order_ids[start : start + batch_size], using)
+
+
+def _refresh_orders(order_ids, using):
+    ledger = RolledUpOrder.objects.using(using)
+    ledger_products = RolledUpOrderProduct.objects.using(using)
+    # Orders seen for the first time get an empty row, so that every order
+    # has a row to lock while its contribution is replaced.
+    ledger.bulk_create(
+        [RolledUpOrder(order_id=pk) for pk in order_ids], ignore_conflicts=True
+    )
+    old = {
+        row.order_id: row
+        for row in ledger.select_for_update()
+        .filter(order_id__in=order_ids)
+        .order_by("order_id")
+        if row.date is not None
+    }
+    old_products = list(ledger_products.filter(order_id__in=list(old)))
+    # Read the primary: a replica may not have the commit being rolled up.
+    new, new_products = _contributions(
+        Order.objects.using(using).filter(pk__in=order_ids), using
+    )
+
+    totals = _totals()
+    _add(totals, old, old_products, sign=-1)
+    _add(totals, new, new_products)
+    for (model, key_fields), deltas in zip(ROLLUP_KEYS, totals):
+        _increment(model, key_fields, deltas, using)
+
+    dropped = [pk for pk in order_ids if pk not in new]
+    if dropped:
+        ledger.filter(order_id__in=dropped).delete()
+    ledger.bulk_create(
+        new.values(),
+        update_conflicts=True,
+        unique_fields=["order_id"],
+        update_fields=["date", "user_id", "revenue", "quantity"],
+    )
+    ledger_products.filter(order_id__in=order_ids).delete()
+    ledger_products.bulk_create(new_products)
+
+
+def rebuild_sales_rollups(days):
+    """Recompute the rollup rows of ``days`` from their confirmed/shipped orders.
+
+    Reads every order of the days, so it is meant for the
+    ``rebuild_sales_rollups`` command; refresh_sales_rollups() keeps the rows
+    up to date afterwards. Refreshes wait until the rebuild commits.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+
+    period = Q()
+    for start, end in _periods(days):
+        period |= Q(created_at__gte=start, created_at__lt=end)
+    using = router.db_for_write(DailySales)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                table = connection.ops.quote_name(RolledUpOrder._meta.db_table)
+                cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        orders = Order.objects.using(using).filter(period)
+        stale = RolledUpOrder.objects.using(using).filter(
+            Q(date__in=days) | Q(order_id__in=orders.values("pk"))
+        )
+        RolledUpOrderProduct.objects.using(using).filter(
+            order_id__in=stale.values("order_id")
+        ).delete()
+        stale.delete()
+        for model in ROLLUP_MODELS:
+            model.objects.using(using).filter(date__in=days).delete()
+
+        rolled, products = _contributions(orders, using)
+        totals = _totals()
+        _add(totals, rolled, products)
+        RolledUpOrder.objects.using(using).bulk_create(rolled.values(), batch_size=2000)
+        RolledUpOrderProduct.objects.using(using).bulk_create(products, batch_size=2000)
+        for (model, key_fields), rows in zip(ROLLUP_KEYS, totals):
+            model.objects.using(using).bulk_create(
+                [
+                    model(**dict(zip((*key_fields, *ROLLUP_TOTALS), (*key, *values))))
+                    for key, values in rows.items()
+                ],
+                batch_size=2000,
+            )
@@ -0,0 +1,110 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from .models import ReportJob
+from .services import (
+    COMPARISONS,
+    GRANULARITIES,
+    RANKING_ENTITIES,
+    RANKING_METRICS,
+    RANKING_TIES,
+    SPLITS,
+)
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = (
+            "id",
+            "status",
+            "start_date",
+            "end_date",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "error",
+            "download_url",
+        )
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ReportJob.StatusChoices.DONE:
+            return None
+        url = reverse("sales-report-job-download", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+
+class SalesTimeseriesQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(choices=GRANULARITIES, default="day")
+    split_by = serializers.ChoiceField(choices=SPLITS, required=False)
+
+
+class SalesTimeseriesPointSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    status = serializers.CharField(required=False)
+    user_id = serializers.IntegerField(required=False)
+    customer = serializers.CharField(required=False)
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders_count = serializers.IntegerField()
+
+
+class SalesComparisonQuerySerializer(serializers.Serializer):
+    compare_to = serializers.ListField(
+        child=serializers.ChoiceField(choices=COMPARISONS),
+        default=["month", "year"],
+    )
+    period = serializers.ListField(
+        child=serializers.RegexField(r"^\d{4}-\d{2}-\d{2}\.\.\d{4}-\d{2}-\d{2}$"),
+        required=False,
+        max_length=12,
+    )
+
+
+class RankedCustomerSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class RankedProductSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+    total_quantity_sold = serializers.IntegerField()
+
+
+class SalesPeriodSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    total_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_orders_count = serializers.IntegerField()
+    total_revenue_change = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_revenue_change_pct = serializers.DecimalField(
+        max_digits=10, decimal_places=2, allow_null=True
+    )
+    total_orders_count_change = serializers.IntegerField()
+    total_orders_count_change_pct = serializers.DecimalField(
+        max_digits=10, decimal_places=2, allow_null=True
+    )
+    top_customers = RankedCustomerSerializer(many=True)
+    top_products = RankedProductSerializer(many=True)
+
+
+class SalesRankingQuerySerializer(serializers.Serializer):
+    entity = serializers.ChoiceField(
+        choices=list(RANKING_ENTITIES), default="customers"
+    )
+    metric = serializers.ChoiceField(choices=RANKING_METRICS, default="revenue")
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=5)
+    ties = serializers.ChoiceField(choices=list(RANKING_TIES), default="include")
+
+
+class SalesRankingRowSerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    quantity = serializers.IntegerField()
+    orders_count = serializers.IntegerField()
@@ -0,0 +1,569 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import pairwise
+
+from dateutil.parser import parse
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    F,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import DenseRank, Rank, RowNumber, Trunc
+from django.utils import timezone
+
+from analytics.models import Order
+from shop_analytics.db_router import primary_reads_after
+from shop_analytics.filters import day_start
+
+from .models import DailyCustomerSales, DailyProductSales, DailySales
+from .rollups import SALES_STATUSES
+
+REPORT_CACHE_ALIAS = "reports"
+VERSION_KEY = "sales-report:version:{:%Y-%m}"
+GRANULARITIES = ("day", "week", "month")
+COMPARISONS = ("previous", "month", "year")
+RANKING_ENTITIES = {
+    "customers": (DailyCustomerSales, "user_id", ["user__full_name", "user__email"]),
+    "products": (DailyProductSales, "product_id", ["product__name"]),
+}
+RANKING_METRICS = ("revenue", "quantity", "orders_count")
+RANKING_TIES = {"include": Rank, "dense": DenseRank, "first": RowNumber}
+SPLITS = ("status", "customer")
+HITS_KEY = "sales-report:hits"
+MISSES_KEY = "sales-report:misses"
+
+
+def get_report_cache():
+    return caches[REPORT_CACHE_ALIAS]
+
+
+def _months(start_date, end_date):
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def _buckets(start_date, end_date, granularity):
+    """Yield the first day of every ``granularity`` bucket touching the period."""
+    if granularity == "month":
+        yield from _months(start_date, end_date)
+        return
+    step = timedelta(days=7 if granularity == "week" else 1)
+    bucket = (
+        start_date - timedelta(days=start_date.weekday())
+        if step.days == 7
+        else start_date
+    )
+    while bucket <= end_date:
+        yield bucket
+        bucket += step
+
+
+def _increment(cache, key):
+    # The two counters are fixed keys that never expire.
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def bump_data_version(dates):
+    """Invalidate cached reports covering the months of ``dates``.
+
+    Every month carries its own version token, so changing today's orders
+    leaves reports over earlier months cached.
+    """
+    months = {timezone.localtime(value).date().replace(day=1) for value in dates}
+    # Versions never expire: a month's reports stay valid until it changes.
+    get_report_cache().set_many(
+        {VERSION_KEY.format(month): time.time_ns() for month in months},
+        timeout=None,
+    )
+
+
+def get_cache_metrics():
+    cache = get_report_cache()
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0),
+    }
+
+
+class SalesReport:
+    """Sales figures of confirmed and shipped orders for an inclusive date range.
+
+    Results are cached in the shared ``reports`` cache for its ``TIMEOUT``,
+    under the period plus the data version of every calendar month it covers,
+    so a change only invalidates the reports overlapping its month.
+    """
+
+    relevant_statuses = SALES_STATUSES
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.cache_hit = None
+        self.cache_key = None
+        self.written_at = None
+
+    @classmethod
+    def from_params(cls, params):
+        """Build a report from ``start_date``/``end_date`` query parameters.
+
+        Defaults to the 30 days up to today; raises ``ValueError`` on bad dates.
+        """
+        start_date_str = params.get("start_date")
+        end_date_str = params.get("end_date")
+
+        if not end_date_str:
+            end_date = timezone.now().date()
+        else:
+            end_date = parse(end_date_str).date()
+
+        if not start_date_str:
+            start_date = end_date - timedelta(days=30)
+        else:
+            start_date = parse(start_date_str).date()
+
+        return cls(start_date, end_date)
+
+    @property
+    def start_datetime(self):
+        return day_start(self.start_date)
+
+    @property
+    def end_datetime(self):
+        """Exclusive upper bound: midnight after ``end_date``."""
+        return day_start(self.end_date + timedelta(days=1))
+
+    def get_orders(self):
+        return Order.objects.filter(
+            status__in=self.relevant_statuses,
+            created_at__gte=self.start_datetime,
+            created_at__lt=self.end_datetime,
+        )
+
+    def _cache_key(self, cache):
+        keys = [
+            VERSION_KEY.format(month)
+            for month in _months(self.start_date, self.end_date)
+        ]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # A month without a version, or whose version was culled,
+                # gets one, which only drops the reports cached under the old.
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = cache.get(key)
+        # Versions are the time of the last change, in nanoseconds.
+        self.written_at = max(versions.values(), default=0) / 1e9
+        digest = hashlib.sha1(
+            ":".join(str(versions[key]) for key in keys).encode()
+        ).hexdigest()
+        return f"sales-report:{self.start_date}:{self.end_date}:{digest}"
+
+    def _cached(self, name, compute):
+        """Return ``compute()``, cached under the period's data version and ``name``."""
+        cache = get_report_cache()
+        self.cache_key = self._cache_key(cache)
+        key = f"{self.cache_key}:{name}" if name else self.cache_key
+        value = cache.get(key)
+        self.cache_hit = value is not None
+        if self.cache_hit:
+            _increment(cache, HITS_KEY)
+        else:
+            _increment(cache, MISSES_KEY)
+            # A replica may not have the change yet that bumped the version.
+            with primary_reads_after(self.written_at):
+                value = compute()
+            cache.set(key, value)
+        return value
+
+    def get_context(self):
+        """Return the report figures, computing them only on a cache miss."""
+        return {
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "report_date": timezone.now().strftime("%Y-%m-%d"),
+            **self._cached(None, self.compute),
+        }
+
+    def get_timeseries(self, granularity="day", split_by=None):
+        """Return the cached ``compute_timeseries`` rows."""
+        return self._cached(
+            f"timeseries:{granularity}:{split_by or ''}",
+            lambda: self.compute_timeseries(granularity, split_by),
+        )
+
+    def compute_timeseries(self, granularity="day", split_by=None):
+        """Revenue and order count per day, week or month of the period.
+
+        ``split_by`` may be ``"status"`` or ``"customer"`` to get one row per
+        bucket and status or customer. The unsplit and per-customer series are
+        read from the daily rollups, the status split from the orders
+        themselves; either way the buckets come from a single grouped query
+        truncating dates in the database. Empty buckets of an unsplit series
+        are filled with zeros.
+        """
+        if split_by == "status":
+            rows = (
+                self.get_orders()
+                .annotate(period=Trunc("created_at", granularity))
+                .values("period", "status")
+                .annotate(revenue=Sum("total"), orders_count=Count("id"))
+                .order_by("period", "status")
+            )
+        else:
+            model = DailyCustomerSales if split_by == "customer" else DailySales
+            fields = ["period"]
+            if split_by == "customer":
+                fields += ["user_id", "user__full_name", "user__email"]
+            rows = (
+                model.objects.filter(date__range=[self.start_date, self.end_date])
+                .annotate(period=Trunc("date", granularity))
+                .values(*fields)
+                .annotate(revenue=Sum("revenue"), orders_count=Sum("orders_count"))
+                .order_by(*fields[:2])
+            )
+
+        series = []
+        for row in rows:
+            period = row.pop("period")
+            if isinstance(period, datetime):
+                period = timezone.localtime(period).date()
+            if split_by == "customer":
+                full_name, email = row.pop("user__full_name"), row.pop("user__email")
+                row["customer"] = full_name or email
+            series.append({"period": period, **row})
+
+        if split_by is None:
+            filled = {row["period"]: row for row in series}
+            series = [
+                filled.get(
+                    period,
+                    {"period": period, "revenue": Decimal(0), "orders_count": 0},
+                )
+                for period in _buckets(self.start_date, self.end_date, granularity)
+            ]
+        return series
+
+    def compute(self):
+        """Aggregate the report in the database without touching the cache.
+
+        Revenue and order count, the top customers and the most popular product
+        are summed from the daily rollup tables, so their cost grows with the
+        number of days rather than orders. Only the first
+        ``REPORT_DETAIL_ROW_LIMIT`` rows of the order table are included; use
+        ``iter_order_chunks`` for the rest.
+        """
+        totals = DailySales.objects.filter(
+            date__range=[self.start_date, self.end_date]
+        ).aggregate(
+            total_revenue=Sum("revenue", default=0),
+            total_orders_count=Sum("orders_count", default=0),
+        )
+
+        top_customers_list = [
+            {"name": row["name"], "total": row["revenue"]}
+            for row in self.compute_ranking("customers", "revenue", 5, ties="first")
+        ]
+
+        most_popular_product = None
+        for row in self.compute_ranking("products", "quantity", 1, ties="first"):
+            most_popular_product = {
+                "product_id": row["id"],
+                "product__name": row["name"],
+                "total_quantity_sold": row["quantity"],
+            }
+
+        all_orders = list(self.get_order_rows()[: settings.REPORT_DETAIL_ROW_LIMIT])
+
+        return {
+            "all_orders": all_orders,
+            "orders_omitted": max(totals["total_orders_count"] - len(all_orders), 0),
+            "total_revenue": totals["total_revenue"],
+            "total_orders_count": totals["total_orders_count"],
+            "most_popular_product": most_popular_product,
+            "top_customers": top_customers_list,
+        }
+
+    def get_ranking(self, entity, metric="revenue", limit=5, ties="include"):
+        """Return the cached ``compute_ranking`` rows."""
+        return self._cached(
+            f"ranking:{entity}:{metric}:{limit}:{ties}",
+            lambda: self.compute_ranking(entity, metric, limit, ties),
+        )
+
+    def compute_ranking(self, entity, metric="revenue", limit=5, ties="include"):
+        """Rank ``customers`` or ``products`` of the period by ``metric``.
+
+        Ranks come from a window function over the rollup totals and are
+        filtered in the database, so only the returned rows reach Python.
+        ``ties`` picks the window: ``include`` (``RANK()``, tied rows share a
+        rank and may exceed ``limit``), ``dense`` (``DENSE_RANK()``) or
+        ``first`` (``ROW_NUMBER()``, ties broken by id, exactly ``limit`` rows).
+        """
+        model, key, name_fields = RANKING_ENTITIES[entity]
+        function = RANKING_TIES[ties]
+        order_by = [F(metric).desc()]
+        if function is RowNumber:
+            order_by.append(F(key).asc())
+        rows = (
+            model.objects.filter(date__range=[self.start_date, self.end_date])
+            .values(key, *name_fields)
+            .annotate(
+                revenue=Sum("revenue"),
+                quantity=Sum("quantity"),
+                orders_count=Sum("orders_count"),
+            )
+            .annotate(rank=Window(function(), order_by=order_by))
+            .filter(rank__lte=limit)
+            .order_by("rank", key)
+        )
+        return [
+            {
+                "rank": row["rank"],
+                "id": row[key],
+                "name": next(filter(None, (row[field] for field in name_fields)), ""),
+                "revenue": row["revenue"],
+                "quantity": row["quantity"],
+                "orders_count": row["orders_count"],
+            }
+            for row in rows
+        ]
+
+    def get_order_rows(self):
+        """Rows of the report's order table, oldest first."""
+        return (
+            self.get_orders()
+            .order_by("created_at", "id")
+            .annotate(
+                status_label=Case(
+                    *(
+                        When(status=value, then=Value(label))
+                        for value, label in Order.StatusChoices.choices
+                    ),
+                    output_field=CharField(),
+                )
+            )
+            .values("created_at", "status", "status_label", "total", "user__full_name")
+        )
+
+    def iter_order_chunks(self, size):
+        """Yield the whole order table in lists of ``size`` rows.
+
+        Rows come from a server-side cursor, so only one chunk is in memory.
+        """
+        chunk = []
+        for row in self.get_order_rows().iterator(chunk_size=size):
+            chunk.append(row)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _ends_month(day):
+    return (day + timedelta(days=1)).day == 1
+
+
+def _shift(report, delta):
+    """Return ``report``'s period moved back by ``delta``."""
+    if _ends_month(report.end_date):
+        # Move the following day, so Apr 30 goes to Mar 31 rather than Mar 30.
+        end_date = report.end_date + timedelta(days=1) - delta - timedelta(days=1)
+    else:
+        end_date = report.end_date - delta
+    return report.start_date - delta, end_date
+
+
+class SalesComparison:
+    """Sales figures of several periods computed side by side.
+
+    Every rollup row is tagged with the index of the period it falls in, so
+    totals, top customers and top products of all periods each take a single
+    grouped query no matter how many periods are compared. The first period
+    is the reference: every other period gets the change from it to the
+    reference.
+    """
+
+    top_count = 5
+
+    def __init__(self, periods):
+        self.reports = [SalesReport(start, end) for start, end in periods]
+        if not self.reports:
+            raise ValueError("At least one period is required.")
+        ordered = sorted(self.reports, key=lambda report: report.start_date)
+        for report in ordered:
+            if report.start_date > report.end_date:
+                raise ValueError("A period cannot end before it starts.")
+        for previous, report in pairwise(ordered):
+            if report.start_date <= previous.end_date:
+                raise ValueError("Compared periods must not overlap.")
+        self.cache_hit = None
+
+    @classmethod
+    def reference_from_params(cls, params):
+        """Build the reference report of a comparison from query parameters.
+
+        Without dates it covers the last full calendar month, and with only
+        ``end_date`` the month up to that day, so that the ``month``
+        comparison never overlaps it. Raises ``ValueError`` on bad dates.
+        """
+        if params.get("start_date"):
+            return SalesReport.from_params(params)
+        if params.get("end_date"):
+            end_date = parse(params["end_date"]).date()
+        else:
+            end_date = timezone.localdate().replace(day=1) - timedelta(days=1)
+        if _ends_month(end_date):
+            start_date = end_date.replace(day=1)
+        else:
+            start_date = end_date - relativedelta(months=1) + timedelta(days=1)
+        return SalesReport(start_date, end_date)
+
+    @classmethod
+    def from_reference(cls, report, compare_to):
+        """Compare ``report``'s period with earlier ones named in ``compare_to``.
+
+        ``previous`` is the period of the same length right before it,
+        ``month`` and ``year`` are the same dates a month or a year earlier.
+        A period ending on the last day of a month is compared with one ending
+        on the last day of the earlier month, so full months match up.
+        """
+        periods = [(report.start_date, report.end_date)]
+        for name in compare_to:
+            if name == "previous":
+                length = report.end_date - report.start_date + timedelta(days=1)
+                periods.append((report.start_date - length, report.end_date - length))
+            elif name == "month":
+                periods.append(_shift(report, relativedelta(months=1)))
+            elif name == "year":
+                periods.append(_shift(report, relativedelta(years=1)))
+            else:
+                raise ValueError(f"Unknown comparison {name!r}.")
+        return cls(periods)
+
+    def _period(self):
+        return Case(
+            *(
+                When(
+                    date__range=[report.start_date, report.end_date], then=Value(index)
+                )
+                for index, report in enumerate(self.reports)
+            ),
+            output_field=IntegerField(),
+        )
+
+    def _rows(self, model):
+        in_periods = Q()
+        for report in self.reports:
+            in_periods |= Q(date__range=[report.start_date, report.end_date])
+        return model.objects.filter(in_periods).annotate(period=self._period())
+
+    def _top(self, model, group_by, metric):
+        return (
+            self._rows(model)
+            .values("period", *group_by)
+            .annotate(amount=Sum(metric))
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("period"),
+                    order_by=[F("amount").desc(), F(group_by[0]).asc()],
+                )
+            )
+            .filter(position__lte=self.top_count)
+            .order_by("period", "position")
+        )
+
+    def get_periods(self):
+        """Return the cached ``compute`` result."""
+        cache = get_report_cache()
+        versions = ":".join(report._cache_key(cache) for report in self.reports)
+        key = f"sales-compare:{hashlib.sha1(versions.encode()).hexdigest()}"
+        periods = cache.get(key)
+        self.cache_hit = periods is not None
+        if self.cache_hit:
+            _increment(cache, HITS_KEY)
+        else:
+            _increment(cache, MISSES_KEY)
+            written_at = max(report.written_at for report in self.reports)
+            with primary_reads_after(written_at):
+                periods = self.compute()
+            cache.set(key, periods, timeout=None)
+        return periods
+
+    def compute(self):
+        periods = [
+            {
+                "start_date": report.start_date,
+                "end_date": report.end_date,
+                "total_revenue": Decimal(0),
+                "total_orders_count": 0,
+                "top_customers": [],
+                "top_products": [],
+            }
+            for report in self.reports
+        ]
+
+        totals = (
+            self._rows(DailySales)
+            .values("period")
+            .annotate(revenue=Sum("revenue"), orders_count=Sum("orders_count"))
+            .order_by()
+        )
+        for row in totals:
+            periods[row["period"]]["total_revenue"] = row["revenue"]
+            periods[row["period"]]["total_orders_count"] = row["orders_count"]
+
+        customers = self._top(
+            DailyCustomerSales, ["user_id", "user__full_name", "user__email"], "revenue"
+        )
+        for row in customers:
+            periods[row["period"]]["top_customers"].append(
+                {
+                    "name": row["user__full_name"] or row["user__email"],
+                    "total": row["amount"],
+                }
+            )
+
+        products = self._top(
+            DailyProductSales, ["product_id", "product__name"], "quantity"
+        )
+        for row in products:
+            periods[row["period"]]["top_products"].append(
+                {
+                    "product_id": row["product_id"],
+                    "name": row["product__name"],
+                    "total_quantity_sold": row["amount"],
+                }
+            )
+
+        reference = periods[0]
+        for period in periods:
+            for field in ("total_revenue", "total_orders_count"):
+                change = reference[field] - period[field]
+                period[f"{field}_change"] = change
+                period[f"{field}_change_pct"] = (
+                    round(Decimal(change) * 100 / period[field], 2)
+                    if period[field]
+                    else None
+                )
+        return periods
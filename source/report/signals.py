@@ -0,0 +1,14 @@
+from django.dispatch import receiver
+
+from analytics.models import orders_changed
+
+from .rollups import refresh_sales_rollups
+from .services import bump_data_version
+
+
+@receiver(orders_changed)
+def refresh_sales_reports(sender, order_ids, dates, **kwargs):
+    # Rollups are updated before the cache version moves on, so a report
+    # computed under the new version never reads stale rollup rows.
+    refresh_sales_rollups(order_ids)
+    bump_data_version(dates)
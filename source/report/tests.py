@@ -1,3 +1,946 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from pypdf import PdfReader, PdfWriter
+from rest_framework.test import APIClient
+
+from analytics.models import Order, OrderProduct, Product
+from shop_analytics.filters import day_start
+
+from .exports import EXPORT_HEADERS, stream_xlsx
+from .jobs import claim_jobs, recover_stale_jobs, run_job
+from .models import (
+    DailyCustomerSales,
+    DailyProductSales,
+    DailySales,
+    ReportJob,
+    RolledUpOrder,
+)
+from .rendering import PdfCache, SalesReportPdf, build_report_pdf
+from .rollups import refresh_sales_rollups
+from .services import (
+    SalesReport,
+    bump_data_version,
+    get_cache_metrics,
+    get_report_cache,
+)
+
+User = get_user_model()
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "reports": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "report-tests",
+        "TIMEOUT": 3600,
+    },
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReportTestCase(TestCase):
+    """Orders of one 100 KZT product, confirmed on the given days."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            "owner@example.com", "Owner", "password", is_staff=True
+        )
+        cls.customer = User.objects.create_user(
+            "customer@example.com", "Customer", "password"
+        )
+        cls.product = Product.objects.create(
+            user=cls.owner, name="Lamp", price="100.00", stock_quantity=1000
+        )
+
+    def setUp(self):
+        get_report_cache().clear()
+
+    def create_sale(
+        self,
+        day,
+        quantity=1,
+        user=None,
+        status="confirmed",
+        at=timedelta(hours=12),
+        product=None,
+    ):
+        """Create an order placed ``at`` into ``day`` and move it to ``status``."""
+        order = Order.objects.create(user=user or self.customer)
+        OrderProduct.objects.create(
+            order=order, product=product or self.product, quantity=quantity
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=day_start(day) + at)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=order.pk).transition_to(status)
+        return order
+
+
+class SalesReportCacheTests(ReportTestCase):
+    def test_repeated_report_is_served_from_cache(self):
+        self.create_sale(date(2024, 3, 5), quantity=2)
+
+        first = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(first.get_context()["total_revenue"], Decimal("200.00"))
+        self.assertFalse(first.cache_hit)
+
+        second = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        with self.assertNumQueries(0):
+            context = second.get_context()
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(context["total_revenue"], Decimal("200.00"))
+        self.assertEqual(get_cache_metrics(), {"hits": 1, "misses": 1})
+
+    def test_change_only_invalidates_reports_of_its_month(self):
+        self.create_sale(date(2024, 1, 10))
+        self.create_sale(date(2024, 3, 5))
+        january = SalesReport(date(2024, 1, 1), date(2024, 1, 31))
+        march = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        january.get_context()
+        march.get_context()
+
+        self.create_sale(date(2024, 3, 20), quantity=4)
+
+        january = SalesReport(date(2024, 1, 1), date(2024, 1, 31))
+        january.get_context()
+        self.assertTrue(january.cache_hit)
+        march = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(march.get_context()["total_revenue"], Decimal("500.00"))
+        self.assertFalse(march.cache_hit)
+
+    def test_past_month_stays_cached_after_its_result_expires(self):
+        self.create_sale(date(2024, 3, 5), quantity=2)
+        first = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        first.get_context()
+
+        cache = get_report_cache()
+        version_key = cache.make_key("sales-report:version:2024-03")
+        self.assertIsNone(cache._expire_info[version_key])
+        # Only the result follows the cache timeout; let it run out.
+        cache._expire_info[cache.make_key(first.cache_key)] = 0
+
+        again = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        again.get_context()
+        self.assertFalse(again.cache_hit)
+        self.assertEqual(again.cache_key, first.cache_key)
+
+        cached = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        with self.assertNumQueries(0):
+            context = cached.get_context()
+        self.assertTrue(cached.cache_hit)
+        self.assertEqual(cached.cache_key, first.cache_key)
+        self.assertEqual(context["total_revenue"], Decimal("200.00"))
+
+
+class SalesRollupTests(ReportTestCase):
+    day = date(2024, 3, 5)
+
+    def rollups(self):
+        return (
+            list(DailySales.objects.values_list("date", "revenue", "orders_count")),
+            list(
+                DailyCustomerSales.objects.order_by("user_id").values_list(
+                    "user_id", "quantity"
+                )
+            ),
+            list(DailyProductSales.objects.values_list("product_id", "quantity")),
+        )
+
+    def test_draft_changes_leave_rollups_alone(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = Order.objects.create(user=self.customer)
+            OrderProduct.objects.create(order=order, product=self.product, quantity=2)
+            order.delete()
+
+        self.assertEqual(callbacks, [])
+
+    def test_rollups_follow_confirmations_line_changes_and_cancellations(self):
+        order = self.create_sale(self.day, quantity=2)
+        self.assertEqual(
+            self.rollups(),
+            (
+                [(self.day, Decimal("200.00"), 1)],
+                [(self.customer.pk, 2)],
+                [(self.product.pk, 2)],
+            ),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderProduct.objects.create(order=order, product=self.product, quantity=1)
+        self.assertEqual(
+            self.rollups(),
+            (
+                [(self.day, Decimal("300.00"), 1)],
+                [(self.customer.pk, 3)],
+                [(self.product.pk, 3)],
+            ),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=order.pk).transition_to("cancelled")
+        self.assertEqual(self.rollups(), ([], [], []))
+
+    def test_refresh_applies_only_the_changes_of_its_orders(self):
+        order = self.create_sale(self.day)
+        other = User.objects.create_user("other@example.com", "Other", "password")
+        # Rows written for orders the refresh is not about are left as they are.
+        DailySales.objects.filter(date=self.day).update(revenue=999, orders_count=9)
+        DailyCustomerSales.objects.create(
+            date=self.day, user=other, revenue=1, orders_count=1, quantity=1
+        )
+        OrderProduct.objects.filter(order=order).update(quantity=3)
+        Order.objects.filter(pk=order.pk).refresh_totals()
+
+        with self.assertNumQueries(13):
+            refresh_sales_rollups([order.pk])
+
+        self.assertEqual(
+            self.rollups(),
+            (
+                [(self.day, Decimal("1199.00"), 9)],
+                [(self.customer.pk, 3), (other.pk, 1)],
+                [(self.product.pk, 3)],
+            ),
+        )
+        refresh_sales_rollups([order.pk])
+        self.assertEqual(
+            DailySales.objects.get(date=self.day).revenue, Decimal("1199.00")
+        )
+
+    def test_deleted_orders_are_taken_out(self):
+        order = self.create_sale(self.day, quantity=2)
+        self.create_sale(self.day)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get(pk=order.pk).delete()
+
+        self.assertEqual(
+            self.rollups(),
+            (
+                [(self.day, Decimal("100.00"), 1)],
+                [(self.customer.pk, 1)],
+                [(self.product.pk, 1)],
+            ),
+        )
+        self.assertFalse(RolledUpOrder.objects.filter(order_id=order.pk).exists())
+
+    def test_rebuild_command(self):
+        order = self.create_sale(self.day, quantity=2)
+        self.create_sale(self.day + timedelta(days=40))
+        expected = self.rollups()
+        DailySales.objects.all().delete()
+        DailyProductSales.objects.filter(date=self.day).update(quantity=7)
+        DailySales.objects.create(date=date(2020, 1, 1), revenue=5, orders_count=1)
+        RolledUpOrder.objects.create(order_id=0, date=date(2020, 1, 1), revenue=5)
+
+        call_command(
+            "rebuild_sales_rollups", "--days-per-batch", "7", stdout=StringIO()
+        )
+
+        self.assertEqual(self.rollups(), expected)
+        self.assertEqual(RolledUpOrder.objects.count(), 2)
+        # Later changes apply on top of the rebuilt rows.
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=order.pk).transition_to("cancelled")
+        self.assertEqual(
+            list(DailySales.objects.values_list("date", flat=True)),
+            [self.day + timedelta(days=40)],
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "Uses concurrent connections.")
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentRollupRefreshTests(TransactionTestCase):
+    def test_concurrent_confirmations_of_a_day_add_up(self):
+        day = date(2024, 3, 5)
+        user = User.objects.create_user("customer@example.com", "Customer", "pw")
+        product = Product.objects.create(
+            user=user, name="Lamp", price="100.00", stock_quantity=1000
+        )
+        orders = []
+        for _ in range(8):
+            order = Order.objects.create(user=user)
+            OrderProduct.objects.create(order=order, product=product, quantity=3)
+            orders.append(order.pk)
+        Order.objects.update(created_at=day_start(day) + timedelta(hours=12))
+        barrier = threading.Barrier(len(orders))
+        errors = []
+
+        def confirm(pk):
+            try:
+                barrier.wait()
+                Order.objects.filter(pk=pk).transition_to("confirmed")
+            except DatabaseError as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=confirm, args=(pk,)) for pk in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            list(
+                DailySales.objects.values_list(
+                    "date", "revenue", "orders_count", "quantity"
+                )
+            ),
+            [(day, Decimal("2400.00"), 8, 24)],
+        )
+        self.assertEqual(
+            list(DailyProductSales.objects.values_list("orders_count", "quantity")),
+            [(8, 24)],
+        )
+
+
+class SalesExportTests(ReportTestCase):
+    client_class = APIClient
+    url = "/api/report/sales/export"
+
+    def setUp(self):
+        super().setUp()
+        self.period = {"start_date": "2024-03-01", "end_date": "2024-03-31"}
+        self.client.force_authenticate(self.owner)
+        self.first = self.create_sale(date(2024, 3, 5), quantity=2)
+        self.second = self.create_sale(date(2024, 3, 20))
+        self.create_sale(date(2024, 3, 21), status="draft")
+        self.create_sale(date(2024, 4, 1))
+
+    def export(self, **params):
+        response = self.client.get(self.url, {**self.period, **params})
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def expected_rows(self):
+        return [
+            [str(order.pk), "confirmed", "customer@example.com", total]
+            for order, total in ((self.first, "200.00"), (self.second, "100.00"))
+        ]
+
+    def test_csv_lists_the_sales_of_the_period(self):
+        rows = list(csv.reader(io.StringIO(self.export().decode())))
+
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual(
+            [[row[0], row[2], row[3], row[-1]] for row in rows[1:]],
+            self.expected_rows(),
+        )
+
+    def test_xlsx_lists_the_sales_of_the_period(self):
+        with zipfile.ZipFile(io.BytesIO(self.export(file_format="xlsx"))) as workbook:
+            sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+        rows = [
+            re.findall(r"<(?:t|v)>([^<]*)</", row)
+            for row in re.findall(r"<row>(.*?)</row>", sheet)
+        ]
+
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual(
+            [[row[0], row[2], row[3], row[-1]] for row in rows[1:]],
+            self.expected_rows(),
+        )
+
+    def test_xlsx_is_streamed_in_chunks_and_drops_invalid_characters(self):
+        rows = [(index, f"note\x01{index}") for index in range(5)]
+
+        chunks = list(stream_xlsx(rows, rows_per_chunk=2))
+
+        self.assertGreater(len([chunk for chunk in chunks if chunk]), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as workbook:
+            sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+        self.assertIn("<t>note4</t>", sheet)
+        self.assertNotIn("\x01", sheet)
+
+    def test_invalid_requests(self):
+        for params, status in (
+            ({"file_format": "pdf"}, 400),
+            ({"start_date": "not-a-date"}, 400),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, {**self.period, **params})
+                self.assertEqual(response.status_code, status)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url, self.period).status_code, 403)
+
+
+class ChunkedPdfTests(SimpleTestCase):
+    """Chunks are laid out one at a time, written to disk and merged."""
+
+    def render_document(self, html_string, stylesheet):
+        # A stand-in for a laid-out document with one page per table row.
+        self.rendered.append(html_string)
+        pages = max(html_string.count("<tr"), 1)
+        document = mock.Mock()
+
+        def write_pdf(target):
+            writer = PdfWriter()
+            for _ in range(pages):
+                writer.add_blank_page(width=595, height=842)
+            writer.write(target)
+
+        document.write_pdf.side_effect = write_pdf
+        return document
+
+    def write_pdf(self, chunks):
+        self.rendered = []
+        context = {
+            "start_date": date(2024, 3, 1),
+            "end_date": date(2024, 3, 31),
+            "all_orders": [],
+        }
+        pdf = SalesReportPdf(context, order_chunks=lambda: iter(chunks))
+        with (
+            mock.patch("report.rendering.get_stylesheet", return_value=("", None)),
+            mock.patch.object(SalesReportPdf, "_render_document", self.render_document),
+            tempfile.NamedTemporaryFile(suffix=".pdf") as target,
+        ):
+            pdf.write_pdf(target.name)
+            return PdfReader(io.BytesIO(target.read()))
+
+    def test_chunks_are_merged_after_the_summary(self):
+        row = {
+            "created_at": day_start(date(2024, 3, 5)),
+            "status": "confirmed",
+            "status_label": "Confirmed",
+            "total": Decimal("100.00"),
+            "user__full_name": "Customer",
+        }
+
+        reader = self.write_pdf([[row] * 3, [row] * 2])
+
+        self.assertEqual(len(self.rendered), 3)
+        self.assertEqual(
+            len(reader.pages),
+            sum(max(html.count("<tr"), 1) for html in self.rendered),
+        )
+        self.assertIn("Таблица всех заказов", self.rendered[1])
+        self.assertNotIn("Таблица всех заказов", self.rendered[2])
+
+    def test_empty_period_still_has_an_order_table(self):
+        self.write_pdf([])
+
+        self.assertEqual(len(self.rendered), 2)
+        self.assertIn("Таблица всех заказов", self.rendered[1])
+
+
+class SalesReportPdfTests(ReportTestCase):
+    client_class = APIClient
+    url = "/api/report/sales"
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+
+    def digest(self):
+        report = SalesReport(date(2024, 3, 1), date(2024, 3, 31))
+        return build_report_pdf(
+            report, report.get_context(), base_url="http://testserver/"
+        ).digest
+
+    def test_digest_only_changes_with_the_rendered_content(self):
+        self.create_sale(date(2024, 3, 5))
+        digest = self.digest()
+
+        bump_data_version([day_start(date(2024, 3, 5))])
+        self.assertEqual(self.digest(), digest)
+
+        self.create_sale(date(2024, 3, 6))
+        self.assertNotEqual(self.digest(), digest)
+
+    def test_matching_etag_is_answered_without_rendering(self):
+        self.create_sale(date(2024, 3, 5))
+        etag = f'"{self.digest()}"'
+
+        with (
+            mock.patch.object(SalesReportPdf, "write_pdf") as write_pdf,
+            mock.patch.object(SalesReportPdf, "cached") as cached,
+        ):
+            response = self.client.get(
+                self.url,
+                {"start_date": "2024-03-01", "end_date": "2024-03-31"},
+                HTTP_IF_NONE_MATCH=etag,
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        write_pdf.assert_not_called()
+        cached.assert_not_called()
+
+    def test_pdf_is_streamed_from_the_rendered_file(self):
+        def write_pdf(pdf, target):
+            with open(target, "wb") as pdf_file:
+                pdf_file.write(b"%PDF-1.7 report")
+
+        with (
+            mock.patch.object(SalesReportPdf, "write_pdf", write_pdf),
+            mock.patch("report.rendering.get_pdf_cache", return_value=None),
+        ):
+            response = self.client.get(
+                self.url, {"start_date": "2024-03-01", "end_date": "2024-03-31"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.7 report")
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="sales_report_2024-03-01_to_2024-03-31.pdf"',
+        )
+
+
+class PdfCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = PdfCache(directory.name, max_bytes=10)
+
+    def store(self, key, data):
+        def write(path):
+            with open(path, "wb") as pdf_file:
+                pdf_file.write(data)
+
+        with self.cache.store(key, write) as pdf_file:
+            self.assertEqual(pdf_file.read(), data)
+
+    def read(self, key):
+        pdf_file = self.cache.open(key)
+        if pdf_file is None:
+            return None
+        with pdf_file:
+            return pdf_file.read()
+
+    def age(self, key, seconds):
+        path = self.cache._path(key)
+        mtime = os.stat(path).st_mtime - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_least_recently_used_entries_are_evicted_past_the_bound(self):
+        self.store("a", b"aaaa")
+        self.age("a", 30)
+        self.store("b", b"bbbb")
+        self.age("b", 20)
+        # Reading "a" makes "b" the least recently used entry.
+        self.assertEqual(self.read("a"), b"aaaa")
+
+        self.store("c", b"cccc")
+
+        self.assertEqual(self.read("a"), b"aaaa")
+        self.assertIsNone(self.read("b"))
+        self.assertEqual(self.read("c"), b"cccc")
+
+    def test_entries_larger_than_the_bound_are_returned_but_not_kept(self):
+        self.store("big", b"x" * 11)
+
+        self.assertIsNone(self.read("big"))
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+
+def write_fake_pdf(pdf, target):
+    with open(target, "wb") as pdf_file:
+        pdf_file.write(b"%PDF-1.7 report")
+
+
+class ReportJobTests(ReportTestCase):
+    client_class = APIClient
+    url = "/api/report/sales/jobs"
+
+    def setUp(self):
+        super().setUp()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.enterContext(
+            mock.patch("report.rendering.get_pdf_cache", return_value=None)
+        )
+
+    def create_job(self, user=None, **fields):
+        return ReportJob.objects.create(
+            requested_by=user or self.customer,
+            start_date=date(2024, 3, 1),
+            end_date=date(2024, 3, 31),
+            **fields,
+        )
+
+    def test_claim_marks_the_oldest_pending_jobs_running(self):
+        jobs = [self.create_job() for _ in range(3)]
+        self.create_job(status=ReportJob.StatusChoices.DONE)
+
+        self.assertEqual(claim_jobs(2), [jobs[0].pk, jobs[1].pk])
+        self.assertEqual(claim_jobs(2), [jobs[2].pk])
+        self.assertEqual(claim_jobs(2), [])
+
+        jobs[0].refresh_from_db()
+        self.assertEqual(jobs[0].status, ReportJob.StatusChoices.RUNNING)
+        self.assertEqual(jobs[0].attempts, 1)
+        self.assertIsNotNone(jobs[0].started_at)
+
+    def test_run_job_stores_the_pdf(self):
+        self.create_sale(date(2024, 3, 5))
+        job = self.create_job()
+        claim_jobs(1)
+
+        with mock.patch.object(SalesReportPdf, "write_pdf", write_fake_pdf):
+            self.assertEqual(run_job(job.pk, timeout=30), ReportJob.StatusChoices.DONE)
+
+        job.refresh_from_db()
+        self.assertEqual(job.error, "")
+        self.assertIsNotNone(job.finished_at)
+        with job.file.open("rb") as pdf_file:
+            self.assertEqual(pdf_file.read(), b"%PDF-1.7 report")
+
+    def test_errors_and_timeouts_fail_the_job(self):
+        def hang(pdf, target):
+            time.sleep(5)
+
+        for write_pdf, error in (
+            (mock.Mock(side_effect=OSError("disk full")), "disk full"),
+            (hang, "Report rendering timed out."),
+        ):
+            with self.subTest(error=error):
+                job = self.create_job()
+                claim_jobs(1)
+                with mock.patch.object(SalesReportPdf, "write_pdf", write_pdf):
+                    status = run_job(job.pk, timeout=1)
+
+                job.refresh_from_db()
+                self.assertEqual(status, ReportJob.StatusChoices.FAILED)
+                self.assertEqual(job.status, ReportJob.StatusChoices.FAILED)
+                self.assertEqual(job.error, error)
+                self.assertFalse(job.file)
+
+    def test_stale_jobs_are_requeued_until_the_attempts_run_out(self):
+        job = self.create_job()
+        fresh = self.create_job()
+        max_attempts = settings.REPORT_JOB_MAX_ATTEMPTS
+        for attempt in range(1, max_attempts + 1):
+            self.assertEqual(claim_jobs(1), [job.pk])
+            # The worker died: the job stays running past twice the timeout.
+            ReportJob.objects.filter(pk=job.pk).update(
+                started_at=timezone.now() - timedelta(seconds=25)
+            )
+            self.assertEqual(
+                recover_stale_jobs(timeout=10, max_attempts=max_attempts), 1
+            )
+            job.refresh_from_db()
+            if attempt < max_attempts:
+                self.assertEqual(job.status, ReportJob.StatusChoices.PENDING)
+                self.assertIsNone(job.started_at)
+
+        self.assertEqual(job.status, ReportJob.StatusChoices.FAILED)
+        self.assertEqual(job.attempts, max_attempts)
+        self.assertEqual(job.error, "Worker stopped before the report was rendered.")
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, ReportJob.StatusChoices.PENDING)
+
+    def test_status_and_download_endpoints(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            self.url, {"start_date": "2024-03-01", "end_date": "2024-03-31"}
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        job_url = f"{self.url}/{response.json()['id']}"
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertIsNone(response.json()["download_url"])
+        self.assertEqual(self.client.get(f"{job_url}/download").status_code, 409)
+
+        claim_jobs(1)
+        with mock.patch.object(SalesReportPdf, "write_pdf", write_fake_pdf):
+            run_job(response.json()["id"], timeout=30)
+
+        body = self.client.get(job_url).json()
+        self.assertEqual(body["status"], "done")
+        self.assertEqual(body["download_url"], f"http://testserver{job_url}/download")
+        response = self.client.get(f"{job_url}/download")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.7 report")
+
+        # Jobs of other clients are hidden, but staff see every job.
+        other = User.objects.create_user("other@example.com", "Other", "password")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(job_url).status_code, 404)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(job_url).status_code, 200)
+
+    def test_invalid_dates_are_rejected(self):
+        self.client.force_authenticate(self.customer)
+
+        response = self.client.post(self.url, {"start_date": "not-a-date"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ReportJob.objects.exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "Uses SKIP LOCKED.")
+class ConcurrentJobClaimTests(TransactionTestCase):
+    def test_jobs_locked_by_another_worker_are_skipped(self):
+        user = User.objects.create_user("customer@example.com", "Customer", "pw")
+        jobs = [
+            ReportJob.objects.create(
+                requested_by=user,
+                start_date=date(2024, 3, 1),
+                end_date=date(2024, 3, 31),
+            )
+            for _ in range(2)
+        ]
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_first_job():
+            try:
+                with transaction.atomic():
+                    ReportJob.objects.select_for_update().get(pk=jobs[0].pk)
+                    locked.set()
+                    release.wait(timeout=30)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_first_job)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(timeout=30))
+            self.assertEqual(claim_jobs(5), [jobs[1].pk])
+        finally:
+            release.set()
+            thread.join(timeout=30)
+
+        self.assertEqual(claim_jobs(5), [jobs[0].pk])
+
+
+class SalesTimeseriesTests(ReportTestCase):
+    client_class = APIClient
+    url = "/api/report/sales/timeseries"
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+
+    def series(self, start_date, end_date, **params):
+        response = self.client.get(
+            self.url, {"start_date": start_date, "end_date": end_date, **params}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [tuple(point.values()) for point in response.json()["series"]]
+
+    def test_days_are_zero_filled(self):
+        self.create_sale(date(2024, 3, 3), quantity=2)
+        self.create_sale(date(2024, 3, 5))
+
+        self.assertEqual(
+            self.series("2024-03-02", "2024-03-05"),
+            [
+                ("2024-03-02", "0.00", 0),
+                ("2024-03-03", "200.00", 1),
+                ("2024-03-04", "0.00", 0),
+                ("2024-03-05", "100.00", 1),
+            ],
+        )
+
+    def test_weeks_start_on_monday(self):
+        self.create_sale(date(2024, 3, 3))  # Sunday
+        self.create_sale(date(2024, 3, 4))  # Monday
+        self.create_sale(date(2024, 3, 10), quantity=2)  # Sunday
+
+        self.assertEqual(
+            self.series("2024-03-01", "2024-03-11", granularity="week"),
+            [
+                ("2024-02-26", "100.00", 1),
+                ("2024-03-04", "300.00", 2),
+                ("2024-03-11", "0.00", 0),
+            ],
+        )
+
+    @override_settings(TIME_ZONE="Asia/Almaty")
+    def test_months_split_at_local_midnight(self):
+        # Both orders fall on 31 March in UTC.
+        self.create_sale(date(2024, 3, 31), at=timedelta(hours=23, minutes=30))
+        self.create_sale(
+            date(2024, 4, 1), quantity=2, at=timedelta(minutes=30), status="shipped"
+        )
+
+        self.assertEqual(
+            self.series("2024-02-15", "2024-04-15", granularity="month"),
+            [
+                ("2024-02-01", "0.00", 0),
+                ("2024-03-01", "100.00", 1),
+                ("2024-04-01", "200.00", 1),
+            ],
+        )
+        self.assertEqual(
+            self.series(
+                "2024-02-15", "2024-04-15", granularity="month", split_by="status"
+            ),
+            [
+                ("2024-03-01", "confirmed", "100.00", 1),
+                ("2024-04-01", "shipped", "200.00", 1),
+            ],
+        )
+
+    def test_split_by_customer(self):
+        other = User.objects.create_user("other@example.com", "", "password")
+        self.create_sale(date(2024, 3, 4))
+        self.create_sale(date(2024, 3, 5), user=other, quantity=3)
+
+        self.assertEqual(
+            self.series(
+                "2024-03-01", "2024-03-31", granularity="month", split_by="customer"
+            ),
+            [
+                ("2024-03-01", self.customer.pk, "Customer", "100.00", 1),
+                ("2024-03-01", other.pk, "other@example.com", "300.00", 1),
+            ],
+        )
+
+    def test_invalid_parameters(self):
+        for params, field in (
+            ({"granularity": "hour"}, "granularity"),
+            ({"split_by": "product"}, "split_by"),
+            ({"start_date": "not-a-date"}, "error"),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json())
+
+
+class SalesRankingTests(ReportTestCase):
+    client_class = APIClient
+    url = "/api/report/sales/rankings"
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+        # Revenue of 300, 300, 200, 200 and 100 KZT, customers in id order.
+        self.customers = []
+        for name, quantity in (("A", 3), ("B", 3), ("C", 2), ("D", 2), ("E", 1)):
+            user = User.objects.create_user(f"{name.lower()}@example.com", name, "x")
+            self.create_sale(date(2024, 3, 4), quantity=quantity, user=user)
+            self.customers.append(user)
+
+    def ranking(self, **params):
+        response = self.client.get(
+            self.url, {"start_date": "2024-03-01", "end_date": "2024-03-31", **params}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(row["rank"], row["name"]) for row in response.json()["results"]]
+
+    def test_ties_share_a_rank_and_may_exceed_the_limit(self):
+        self.assertEqual(
+            self.ranking(limit=3),
+            [(1, "A"), (1, "B"), (3, "C"), (3, "D")],
+        )
+
+    def test_dense_ranks_leave_no_gaps(self):
+        self.assertEqual(
+            self.ranking(limit=3, ties="dense"),
+            [(1, "A"), (1, "B"), (2, "C"), (2, "D"), (3, "E")],
+        )
+
+    def test_first_breaks_ties_by_id(self):
+        self.assertEqual(
+            self.ranking(limit=3, ties="first"),
+            [(1, "A"), (2, "B"), (3, "C")],
+        )
+
+    def test_ranks_products_by_metric(self):
+        chair = Product.objects.create(
+            user=self.owner, name="Chair", price="2000.00", stock_quantity=10
+        )
+        self.create_sale(date(2024, 3, 5), product=chair)
+
+        self.assertEqual(self.ranking(entity="products"), [(1, "Chair"), (2, "Lamp")])
+        self.assertEqual(
+            self.ranking(entity="products", metric="quantity"),
+            [(1, "Lamp"), (2, "Chair")],
+        )
+
+    def test_invalid_parameters(self):
+        for params in ({"ties": "random"}, {"metric": "price"}, {"limit": 0}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+
+class SalesComparisonTests(ReportTestCase):
+    client_class = APIClient
+    url = "/api/report/sales/compare"
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+
+    def periods(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (period["start_date"], period["end_date"], period["total_revenue"])
+            for period in response.json()["periods"]
+        ]
+
+    def test_defaults_compare_last_month(self):
+        self.create_sale(date(2024, 3, 31), quantity=2)
+        self.create_sale(date(2024, 2, 29))
+        self.create_sale(date(2023, 3, 1), quantity=3)
+
+        with mock.patch(
+            "django.utils.timezone.localdate", return_value=date(2024, 4, 10)
+        ):
+            periods = self.periods()
+
+        self.assertEqual(
+            periods,
+            [
+                ("2024-03-01", "2024-03-31", "200.00"),
+                ("2024-02-01", "2024-02-29", "100.00"),
+                ("2023-03-01", "2023-03-31", "300.00"),
+            ],
+        )
+
+    def test_month_long_periods_do_not_overlap_their_month(self):
+        for params, expected in (
+            (
+                {"end_date": "2024-03-15"},
+                [("2024-02-16", "2024-03-15"), ("2024-01-16", "2024-02-15")],
+            ),
+            (
+                {"start_date": "2024-04-01", "end_date": "2024-04-30"},
+                [("2024-04-01", "2024-04-30"), ("2024-03-01", "2024-03-31")],
+            ),
+        ):
+            with self.subTest(params=params):
+                periods = self.periods(compare_to="month", **params)
+                self.assertEqual([period[:2] for period in periods], expected)
+
+    def test_overlapping_periods(self):
+        response = self.client.get(
+            self.url,
+            {
+                "start_date": "2024-01-01",
+                "end_date": "2024-03-31",
+                "compare_to": "month",
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"error": "Compared periods must not overlap."}
+        )
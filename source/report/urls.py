@@ -1,8 +1,37 @@
 from django.urls import path
 
-from report.views import GetSalesReportView, get_sales_html
+from report.views import (
+    GetSalesReportView,
+    SalesComparisonView,
+    SalesExportView,
+    SalesRankingView,
+    SalesReportJobCreateView,
+    SalesReportJobDetailView,
+    SalesReportJobDownloadView,
+    SalesTimeseriesView,
+    get_sales_html,
+)
 
 urlpatterns = [
     path("sales", GetSalesReportView.as_view()),
     path("sales-html/", get_sales_html, name="sales-report-html"),
+    path("sales/export", SalesExportView.as_view(), name="sales-report-export"),
+    path(
+        "sales/timeseries",
+        SalesTimeseriesView.as_view(),
+        name="sales-report-timeseries",
+    ),
+    path("sales/compare", SalesComparisonView.as_view(), name="sales-report-compare"),
+    path("sales/rankings", SalesRankingView.as_view(), name="sales-report-rankings"),
+    path("sales/jobs", SalesReportJobCreateView.as_view(), name="sales-report-jobs"),
+    path(
+        "sales/jobs/<int:pk>",
+        SalesReportJobDetailView.as_view(),
+        name="sales-report-job",
+    ),
+    path(
+        "sales/jobs/<int:pk>/download",
+        SalesReportJobDownloadView.as_view(),
+        name="sales-report-job-download",
+    ),
 ]
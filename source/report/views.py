@@ -1,22 +1,63 @@
+import asyncio
+import hashlib
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
+from rest_framework.generics import RetrieveAPIView
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import HttpResponse
-from django.utils import timezone
-from django.template.loader import render_to_string
-from django.contrib.staticfiles import finders
-from datetime import datetime, timedelta
-from collections import defaultdict
-from django.db.models import Sum
-from weasyprint import HTML, CSS
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from dateutil.parser import parse
-from analytics.models import Order, OrderProduct
+from shop_analytics.async_views import (
+    AsyncDispatchMixin,
+    is_asgi_request,
+    streaming_content,
+)
+from shop_analytics.db_router import ReplicaReadMixin, reads_from_replica, use_replica
+from .exports import export_rows, stream_csv, stream_xlsx
+from .models import ReportJob
+from .rendering import (
+    build_report_pdf,
+    get_render_executor,
+    open_temporary,
+    render_report_pdf,
+)
+from .serializers import (
+    ReportJobSerializer,
+    SalesComparisonQuerySerializer,
+    SalesPeriodSerializer,
+    SalesRankingQuerySerializer,
+    SalesRankingRowSerializer,
+    SalesTimeseriesPointSerializer,
+    SalesTimeseriesQuerySerializer,
+)
+from .services import (
+    COMPARISONS,
+    GRANULARITIES,
+    RANKING_ENTITIES,
+    RANKING_METRICS,
+    RANKING_TIES,
+    SPLITS,
+    SalesComparison,
+    SalesReport,
+)
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
 
+class GetSalesReportView(ReplicaReadMixin, AsyncDispatchMixin, APIView):
+    replica_actions = ("get",)
 
-class GetSalesReportView(APIView):
     @swagger_auto_schema(
         operation_description="Generate a sales report PDF for a specified date range. "
         "The report includes total revenue, total orders, top 5 customers by revenue, "
@@ -41,6 +82,15 @@ class GetSalesReportView(APIView):
                 required=False,
                 example="2023-01-31",
             ),
+            openapi.Parameter(
+                name="mode",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=["chunked", "summary"],
+                description="chunked renders every order of the period in batches; "
+                "summary only lists the first orders (optional, defaults to chunked).",
+                required=False,
+            ),
         ],
         responses={
             200: openapi.Response(
@@ -50,178 +100,513 @@ class GetSalesReportView(APIView):
                     description="PDF file with sales report data.",
                 ),
             ),
+            304: openapi.Response(
+                description="The report matches the ETag sent in If-None-Match."
+            ),
             400: openapi.Response(description="Invalid date format."),
             401: openapi.Response(description="Authentication required."),
             500: openapi.Response(description="Internal server error."),
         },
     )
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         try:
-            start_date_str = request.query_params.get("start_date")
-            end_date_str = request.query_params.get("end_date")
+            report = SalesReport.from_params(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-            if not end_date_str:
-                end_date = timezone.now().date()
-            else:
-                end_date = parse(end_date_str).date()
+        mode = request.query_params.get("mode", "chunked")
+        if mode not in ("summary", "chunked"):
+            return Response(
+                {"error": "Unsupported mode. Use summary or chunked."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        context = await sync_to_async(report.get_context)()
+        if (
+            mode == "chunked"
+            and context["total_orders_count"] > settings.REPORT_PDF_MAX_ROWS
+        ):
+            return Response(
+                {
+                    "error": f"The period has more than {settings.REPORT_PDF_MAX_ROWS} "
+                    "orders. Use mode=summary or the CSV/XLSX export."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-            if not start_date_str:
-                start_date = end_date - timedelta(days=30)
-            else:
-                start_date = parse(start_date_str).date()
+        base_url = request.build_absolute_uri("/")
+        try:
+            pdf = await sync_to_async(build_report_pdf)(
+                report, context, mode, base_url=base_url
+            )
+        except FileNotFoundError as exc:
+            return Response(
+                {"error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # The ETag hashes the rendered HTML and stylesheet, so a repeated
+        # download of unchanged figures is answered without rendering a PDF.
+        etag = quote_etag(pdf.digest)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            pdf_file = await self.render_pdf(request, pdf, report, mode, base_url)
+            response = FileResponse(
+                pdf_file,
+                as_attachment=True,
+                filename=f"sales_report_{report.start_date}_to_{report.end_date}.pdf",
+                content_type="application/pdf",
+            )
+        response["ETag"] = etag
+        response["X-Report-Cache"] = "hit" if report.cache_hit else "miss"
+        return response
 
-            start_datetime = timezone.make_aware(
-                datetime.combine(start_date, datetime.min.time())
+    async def render_pdf(self, request, pdf, report, mode, base_url):
+        """Return the PDF as an open file, streamed by the response."""
+        pdf_file = await sync_to_async(pdf.cached)()
+        if pdf_file is not None:
+            return pdf_file
+        # Under ASGI the worker serves many requests at once, so rendering,
+        # which holds the GIL for seconds, is moved out of its process.
+        if is_asgi_request(request) and settings.REPORT_RENDER_PROCESSES:
+            path = await asyncio.get_running_loop().run_in_executor(
+                get_render_executor(),
+                render_report_pdf,
+                report.start_date,
+                report.end_date,
+                mode,
+                base_url,
+                reads_from_replica(),
             )
-            end_datetime = timezone.make_aware(
-                datetime.combine(end_date, datetime.max.time())
+            return await sync_to_async(open_temporary)(path)
+        return await sync_to_async(pdf.render)()
+
+
+class SalesExportView(ReplicaReadMixin, APIView):
+    permission_classes = (IsAdminUser,)
+    replica_actions = ("get",)
+
+    @swagger_auto_schema(
+        operation_description="Export every confirmed and shipped order of a period "
+        "as CSV or XLSX, with its stored totals, client and line counts. The file is "
+        "streamed while orders are read, so periods of any size can be exported.",
+        manual_parameters=[
+            openapi.Parameter(
+                name="start_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="Start date for the report in YYYY-MM-DD format (optional, defaults to 30 days before end_date).",
+                required=False,
+                example="2023-01-01",
+            ),
+            openapi.Parameter(
+                name="end_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="End date for the report in YYYY-MM-DD format (optional, defaults to today).",
+                required=False,
+                example="2023-01-31",
+            ),
+            openapi.Parameter(
+                name="file_format",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=["csv", "xlsx"],
+                description="Export file format (optional, defaults to csv).",
+                required=False,
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="A CSV or XLSX file with one row per order.",
+                schema=openapi.Schema(type=openapi.TYPE_FILE),
+            ),
+            400: openapi.Response(description="Invalid date or file format."),
+            403: openapi.Response(description="Staff access required."),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"error": "Unsupported file format. Use csv or xlsx."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        try:
+            report = SalesReport.from_params(request.query_params)
         except ValueError:
             return Response(
                 {"error": "Invalid date format. Use YYYY-MM-DD."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        relevant_statuses = [Order.StatusChoices.CONFIRMED, Order.StatusChoices.SHIPPED]
-        orders_in_period = (
-            Order.objects.filter(
-                created_at__range=[start_datetime, end_datetime],
-                status__in=relevant_statuses,
+        rows = export_rows(report.get_orders())
+        content = stream_csv(rows) if file_format == "csv" else stream_xlsx(rows)
+        response = StreamingHttpResponse(
+            streaming_content(request, content),
+            content_type=EXPORT_CONTENT_TYPES[file_format],
+        )
+        filename = f"orders_{report.start_date}_to_{report.end_date}.{file_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SalesTimeseriesView(ReplicaReadMixin, AsyncDispatchMixin, APIView):
+    replica_actions = ("get",)
+
+    @swagger_auto_schema(
+        operation_description="Revenue and order count of confirmed and shipped orders "
+        "per day, week or month of a period, optionally split by status or customer. "
+        "If no dates are provided, defaults to the last 30 days.",
+        manual_parameters=[
+            openapi.Parameter(
+                name="start_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="Start date for the report in YYYY-MM-DD format (optional, defaults to 30 days before end_date).",
+                required=False,
+                example="2023-01-01",
+            ),
+            openapi.Parameter(
+                name="end_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="End date for the report in YYYY-MM-DD format (optional, defaults to today).",
+                required=False,
+                example="2023-01-31",
+            ),
+            openapi.Parameter(
+                name="granularity",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=list(GRANULARITIES),
+                description="Bucket size (optional, defaults to day).",
+                required=False,
+            ),
+            openapi.Parameter(
+                name="split_by",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=list(SPLITS),
+                description="Return one row per bucket and status or customer (optional).",
+                required=False,
+            ),
+        ],
+        responses={
+            200: SalesTimeseriesPointSerializer(many=True),
+            400: openapi.Response(description="Invalid date, granularity or split."),
+        },
+    )
+    async def get(self, request, *args, **kwargs):
+        query = SalesTimeseriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            report = SalesReport.from_params(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .select_related("user")
-            .prefetch_related("products__product")
+
+        granularity = query.validated_data["granularity"]
+        split_by = query.validated_data.get("split_by")
+        series = await sync_to_async(report.get_timeseries)(granularity, split_by)
+        response = Response(
+            {
+                "start_date": report.start_date,
+                "end_date": report.end_date,
+                "granularity": granularity,
+                "split_by": split_by,
+                "series": SalesTimeseriesPointSerializer(series, many=True).data,
+            }
         )
+        response["X-Report-Cache"] = "hit" if report.cache_hit else "miss"
+        return response
+
+
+class SalesComparisonView(ReplicaReadMixin, AsyncDispatchMixin, APIView):
+    replica_actions = ("get",)
+
+    @swagger_auto_schema(
+        operation_description="Compare revenue, order count, top customers and top "
+        "products of several periods. The first period is start_date..end_date "
+        "(defaults to the last full calendar month) followed by the periods named "
+        "in compare_to, or the explicit period list when given. Every period "
+        "carries its change relative to the first one.",
+        manual_parameters=[
+            openapi.Parameter(
+                name="start_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="Start date for the report in YYYY-MM-DD format (optional, defaults to one month before end_date).",
+                required=False,
+                example="2023-01-01",
+            ),
+            openapi.Parameter(
+                name="end_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="End date for the report in YYYY-MM-DD format (optional, defaults to the end of last month).",
+                required=False,
+                example="2023-01-31",
+            ),
+            openapi.Parameter(
+                name="compare_to",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_STRING, enum=list(COMPARISONS)),
+                collection_format="multi",
+                description="previous: the same number of days right before; month, "
+                "year: the same dates one month or one year earlier "
+                "(optional, defaults to month and year).",
+                required=False,
+            ),
+            openapi.Parameter(
+                name="period",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_STRING),
+                collection_format="multi",
+                description="Explicit periods as YYYY-MM-DD..YYYY-MM-DD, the first "
+                "being the reference (optional, overrides the other parameters).",
+                required=False,
+            ),
+        ],
+        responses={
+            200: SalesPeriodSerializer(many=True),
+            400: openapi.Response(description="Invalid or overlapping periods."),
+        },
+    )
+    async def get(self, request, *args, **kwargs):
+        query = SalesComparisonQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            if query.validated_data.get("period"):
+                comparison = SalesComparison(
+                    [
+                        [parse(value).date() for value in period.split("..")]
+                        for period in query.validated_data["period"]
+                    ]
+                )
+            else:
+                comparison = SalesComparison.from_reference(
+                    SalesComparison.reference_from_params(request.query_params),
+                    query.validated_data["compare_to"],
+                )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        periods = await sync_to_async(comparison.get_periods)()
+        response = Response({"periods": SalesPeriodSerializer(periods, many=True).data})
+        response["X-Report-Cache"] = "hit" if comparison.cache_hit else "miss"
+        return response
+
+
+class SalesRankingView(ReplicaReadMixin, AsyncDispatchMixin, APIView):
+    replica_actions = ("get",)
+
+    @swagger_auto_schema(
+        operation_description="Top customers or products of a period ranked by revenue, "
+        "quantity or order count of confirmed and shipped orders. Ranks are computed "
+        "in the database with window functions. If no dates are provided, defaults "
+        "to the last 30 days.",
+        manual_parameters=[
+            openapi.Parameter(
+                name="start_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="Start date for the report in YYYY-MM-DD format (optional, defaults to 30 days before end_date).",
+                required=False,
+                example="2023-01-01",
+            ),
+            openapi.Parameter(
+                name="end_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="End date for the report in YYYY-MM-DD format (optional, defaults to today).",
+                required=False,
+                example="2023-01-31",
+            ),
+            openapi.Parameter(
+                name="entity",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=list(RANKING_ENTITIES),
+                description="What to rank (optional, defaults to customers).",
+                required=False,
+            ),
+            openapi.Parameter(
+                name="metric",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=list(RANKING_METRICS),
+                description="Ranking metric (optional, defaults to revenue).",
+                required=False,
+            ),
+            openapi.Parameter(
+                name="limit",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Number of ranks to return, 1-100 (optional, defaults to 5).",
+                required=False,
+            ),
+            openapi.Parameter(
+                name="ties",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=list(RANKING_TIES),
+                description="include: tied rows share a rank (RANK); dense: DENSE_RANK; first: exactly limit rows, ties broken by id (optional, defaults to include).",
+                required=False,
+            ),
+        ],
+        responses={
+            200: SalesRankingRowSerializer(many=True),
+            400: openapi.Response(description="Invalid parameters."),
+        },
+    )
+    async def get(self, request, *args, **kwargs):
+        query = SalesRankingQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            report = SalesReport.from_params(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        total_revenue = 0
-        customer_revenue = defaultdict(float)
-        for order in orders_in_period:
-            order.calculated_total = order.calculate_total()
-            total_revenue += float(order.calculated_total)
-            client_name = order.user.get_full_name()
-            customer_revenue[client_name] += float(order.calculated_total)
-
-        top_customers = sorted(
-            customer_revenue.items(), key=lambda item: item[1], reverse=True
-        )[:5]
-        top_customers_list = [
-            {"name": name, "total": total} for name, total in top_customers
-        ]
-
-        total_orders_count = orders_in_period.count()
-
-        most_popular_product = (
-            OrderProduct.objects.filter(order__in=orders_in_period)
-            .values("product__name")
-            .annotate(total_quantity_sold=Sum("quantity"))
-            .order_by("-total_quantity_sold")
-            .first()
+        ranking = await sync_to_async(report.get_ranking)(**query.validated_data)
+        response = Response(
+            {
+                "start_date": report.start_date,
+                "end_date": report.end_date,
+                **query.validated_data,
+                "results": SalesRankingRowSerializer(ranking, many=True).data,
+            }
         )
+        response["X-Report-Cache"] = "hit" if report.cache_hit else "miss"
+        return response
+
+
+class SalesReportJobQuerysetMixin:
+    permission_classes = (IsAuthenticated,)
 
-        context = {
-            "start_date": start_date,
-            "end_date": end_date,
-            "all_orders": orders_in_period,
-            "total_revenue": total_revenue,
-            "total_orders_count": total_orders_count,
-            "most_popular_product": most_popular_product,
-            "top_customers": top_customers_list,
-            "report_date": timezone.now().strftime("%Y-%m-%d"),
-        }
-
-        html_string = render_to_string("index.html", context)
-        css_path = finders.find("css/output.css")
-        if not css_path:
-            print(css_path)
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return ReportJob.objects.none()
+        queryset = ReportJob.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(requested_by=self.request.user)
+        return queryset
+
+
+class SalesReportJobCreateView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    @swagger_auto_schema(
+        operation_description="Queue a sales report PDF for rendering in the background. "
+        "Accepts the same start_date and end_date as the synchronous report and "
+        "returns a job whose status can be polled until the file is ready.",
+        manual_parameters=[
+            openapi.Parameter(
+                name="start_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="Start date for the report in YYYY-MM-DD format (optional, defaults to 30 days before end_date).",
+                required=False,
+                example="2023-01-01",
+            ),
+            openapi.Parameter(
+                name="end_date",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description="End date for the report in YYYY-MM-DD format (optional, defaults to today).",
+                required=False,
+                example="2023-01-31",
+            ),
+        ],
+        responses={
+            202: ReportJobSerializer,
+            400: openapi.Response(description="Invalid date format."),
+            401: openapi.Response(description="Authentication required."),
+        },
+    )
+    def post(self, request, *args, **kwargs):
+        params = request.query_params.copy()
+        params.update(request.data)
+        try:
+            report = SalesReport.from_params(params)
+        except ValueError:
             return Response(
-                {"error": "CSS file not found at static/css/output.css."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {"error": "Invalid date format. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        pdf_file = HTML(
-            string=html_string, base_url=request.build_absolute_uri("/")
-        ).write_pdf(stylesheets=[CSS(filename=css_path)])
+        job = ReportJob.objects.create(
+            requested_by=request.user,
+            start_date=report.start_date,
+            end_date=report.end_date,
+        )
+        serializer = ReportJobSerializer(job, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-        response = HttpResponse(content_type="application/pdf")
-        filename = f"sales_report_{start_date}_to_{end_date}.pdf"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        response.write(pdf_file)
-        return response
+
+class SalesReportJobDetailView(SalesReportJobQuerysetMixin, RetrieveAPIView):
+    serializer_class = ReportJobSerializer
+
+
+class SalesReportJobDownloadView(SalesReportJobQuerysetMixin, RetrieveAPIView):
+    @swagger_auto_schema(
+        operation_description="Download the PDF rendered by a finished report job.",
+        responses={
+            200: openapi.Response(
+                description="A PDF file containing the sales report.",
+                schema=openapi.Schema(type=openapi.TYPE_FILE),
+            ),
+            404: openapi.Response(description="Job not found."),
+            409: openapi.Response(description="The report is not ready yet."),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != ReportJob.StatusChoices.DONE:
+            return Response(
+                {"error": "The report is not ready yet.", "status": job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return FileResponse(
+            job.file.open("rb"),
+            as_attachment=True,
+            filename=f"sales_report_{job.start_date}_to_{job.end_date}.pdf",
+            content_type="application/pdf",
+        )
 
 
 # @login_required # Ensure user is logged in
 def get_sales_html(request):
+    use_replica(request.user)
     try:
-        start_date_str = request.GET.get(
-            "start_date"
-        )  # Use request.GET for query parameters in function-based views
-        end_date_str = request.GET.get("end_date")
-
-        if not end_date_str:
-            end_date = timezone.now().date()
-        else:
-            end_date = parse(end_date_str).date()
-
-        if not start_date_str:
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = parse(start_date_str).date()
-
-        start_datetime = timezone.make_aware(
-            datetime.combine(start_date, datetime.min.time())
-        )
-        end_datetime = timezone.make_aware(
-            datetime.combine(end_date, datetime.max.time())
-        )
+        report = SalesReport.from_params(request.GET)
     except ValueError:
         return HttpResponse(
             "Invalid date format. Use YYYY-MM-DD.",
             status=400,  # Bad Request status code
         )
 
-    relevant_statuses = [Order.StatusChoices.CONFIRMED, Order.StatusChoices.SHIPPED]
-    orders_in_period = (
-        Order.objects.filter(
-            created_at__range=[start_datetime, end_datetime],
-            status__in=relevant_statuses,
-        )
-        .select_related("user")
-        .prefetch_related("products__product")
-    )
-
-    total_revenue = 0
-    customer_revenue = defaultdict(float)
-    for order in orders_in_period:
-        order.calculated_total = order.calculate_total()
-        total_revenue += float(order.calculated_total)
-        client_name = order.user.get_full_name() or order.user.email
-        customer_revenue[client_name] += float(order.calculated_total)
-
-    top_customers = sorted(
-        customer_revenue.items(), key=lambda item: item[1], reverse=True
-    )[:5]
-    top_customers_list = [
-        {"name": name, "total": total} for name, total in top_customers
-    ]
-
-    total_orders_count = orders_in_period.count()
-
-    most_popular_product = (
-        OrderProduct.objects.filter(order__in=orders_in_period)
-        .values("product__name")
-        .annotate(total_quantity_sold=Sum("quantity"))
-        .order_by("-total_quantity_sold")
-        .first()
-    )
-
-    context = {
-        "start_date": start_date,
-        "end_date": end_date,
-        "all_orders": orders_in_period,
-        "total_revenue": total_revenue,
-        "total_orders_count": total_orders_count,
-        "most_popular_product": most_popular_product,
-        "top_customers": top_customers_list,
-        "report_date": timezone.now().strftime("%Y-%m-%d"),
-    }
-
-    return render(request, "index.html", context)
+    response = render(request, "index.html", report.get_context())
+    etag = quote_etag(hashlib.sha256(response.content).hexdigest())
+    response = get_conditional_response(request, etag=etag, response=response)
+    response["ETag"] = etag
+    response["X-Report-Cache"] = "hit" if report.cache_hit else "miss"
+    return response
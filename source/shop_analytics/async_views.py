@@ -0,0 +1,77 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+def is_asgi_request(request):
+    """Whether ``request``, a Django or DRF request, is served over ASGI."""
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+async def aiterate(iterator):
+    """Yield the items of a blocking ``iterator``, advancing it in a worker thread."""
+    iterator = iter(iterator)
+    while (item := await sync_to_async(next)(iterator, _DONE)) is not _DONE:
+        yield item
+
+
+def streaming_content(request, iterator):
+    """Return ``iterator`` in the form a streaming response serves best.
+
+    The ASGI handler buffers a plain iterator completely before sending it,
+    so over ASGI it is wrapped in ``aiterate``.
+    """
+    return aiterate(iterator) if is_asgi_request(request) else iterator
+
+
+class AsyncDispatchMixin:
+    """Dispatch an ``APIView`` or viewset as a coroutine.
+
+    Authentication, permissions and throttling run in a worker thread.
+    Coroutine handlers are awaited on the event loop and use the async ORM;
+    regular handlers keep working and are run in a worker thread. Under WSGI
+    Django runs the view in a one-off event loop.
+    """
+
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        return markcoroutinefunction(super().as_view(*args, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = self.http_method_not_allowed
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), handler)
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:  # noqa: BLE001 - as in APIView.dispatch
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncListModelMixin:
+    """``list`` reading its page with the async ORM.
+
+    The serializer must not touch relations that were not fetched with the
+    page, since lazy queries are not allowed on the event loop.
+    """
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
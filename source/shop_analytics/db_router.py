@@ -0,0 +1,281 @@
+"""Route report and list reads to the ``replica`` database alias.
+
+Views opt in with ``ReplicaReadMixin``; every other query, and every query
+outside a request, uses ``default``. Reads stay on the primary:
+
+- when no ``replica`` alias is configured;
+- when the replica lags more than ``DB_REPLICA_MAX_LAG`` seconds behind, or
+  cannot be reached;
+- for the rest of a request once it has written, and for the requests of
+  the same user until the replica must have caught up, so a client always
+  reads its own writes.
+
+Those users are remembered in the ``DB_REPLICA_PIN_CACHE`` cache, which every
+worker process must share; ``check_pin_cache`` fails the system checks when
+it cannot be.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA = "replica"
+PIN_KEY = "db-replica:pin:{}"
+# Cache backends whose entries other processes never see.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+# Seconds a measured replica lag is trusted before it is queried again.
+LAG_CHECK_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+_routing = ContextVar("db_routing", default=None)
+_lag = {"checked_at": None, "usable": False}
+
+# On a streaming standby, the replay timestamp is that of the last replayed
+# transaction, so an idle but caught-up standby reports no lag. A server that
+# is not in recovery, such as a second instance used for local testing, has
+# no lag.
+_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class Routing:
+    """Routing state of one request: whether it may read from the replica and
+    whether it has written."""
+
+    def __init__(self, replica=False):
+        self.replica = replica
+        self.wrote = False
+
+
+def replica_lag():
+    """Return how many seconds the replica is behind the primary.
+
+    Returns ``None`` when the replica cannot be reached or its lag is
+    unknown. Replicas other than PostgreSQL, such as an SQLite stand-in,
+    never lag.
+    """
+    connection = connections[REPLICA]
+    if connection.vendor != "postgresql":
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(_LAG_SQL)
+            (lag,) = cursor.fetchone()
+    except DatabaseError:
+        logger.warning("The read replica cannot be reached.", exc_info=True)
+        return None
+    return None if lag is None else float(lag)
+
+
+def replica_usable():
+    """Whether a replica is configured and keeps up with the primary.
+
+    The lag is measured at most every ``LAG_CHECK_INTERVAL`` seconds.
+    """
+    if REPLICA not in settings.DATABASES:
+        return False
+    now = time.monotonic()
+    checked_at = _lag["checked_at"]
+    if checked_at is None or now - checked_at >= LAG_CHECK_INTERVAL:
+        lag = replica_lag()
+        _lag["usable"] = lag is not None and lag <= settings.DB_REPLICA_MAX_LAG
+        _lag["checked_at"] = now
+        if lag is not None and not _lag["usable"]:
+            logger.warning("The read replica lags %.1f seconds behind.", lag)
+    return _lag["usable"]
+
+
+def _pin_cache():
+    return caches[settings.DB_REPLICA_PIN_CACHE]
+
+
+def check_pin_cache(app_configs, **kwargs):
+    """Fail when a replica is configured but pins would stay in one process."""
+    if REPLICA not in settings.DATABASES:
+        return []
+    alias = settings.DB_REPLICA_PIN_CACHE
+    if alias not in settings.CACHES:
+        return [
+            checks.Error(
+                f"DB_REPLICA_PIN_CACHE names the undefined cache {alias!r}.",
+                id="shop_analytics.E001",
+            )
+        ]
+    backend = settings.CACHES[alias]["BACKEND"]
+    if backend in PROCESS_LOCAL_CACHES:
+        return [
+            checks.Error(
+                f"DB_REPLICA_PIN_CACHE uses the process-local cache {alias!r}, so "
+                "users who wrote could read stale data from the replica through "
+                "other workers.",
+                hint="Point it at a cache shared by all workers, such as the "
+                "default 'reports' cache, Redis or Memcached.",
+                id="shop_analytics.E002",
+            )
+        ]
+    return []
+
+
+def _pin_seconds():
+    # A replica in use lags at most DB_REPLICA_MAX_LAG seconds, as measured
+    # up to LAG_CHECK_INTERVAL seconds ago.
+    return settings.DB_REPLICA_MAX_LAG + LAG_CHECK_INTERVAL
+
+
+def pin_to_primary(user):
+    """Send the reads of ``user`` to the primary until the replica has their writes."""
+    _pin_cache().set(PIN_KEY.format(user.pk), True, timeout=_pin_seconds())
+
+
+def is_pinned(user):
+    return bool(
+        user is not None
+        and user.is_authenticated
+        and _pin_cache().get(PIN_KEY.format(user.pk))
+    )
+
+
+def reads_from_replica():
+    """Whether reads of the current request or block go to the replica."""
+    routing = _routing.get()
+    return routing is not None and routing.replica and not routing.wrote
+
+
+def use_replica(user=None):
+    """Let the current request read from the replica.
+
+    Nothing changes when the request has written already, when ``user`` wrote
+    recently or when the replica is not usable. Returns whether reads now go
+    to the replica.
+    """
+    routing = _routing.get()
+    if routing is None or routing.wrote:
+        return False
+    routing.replica = not is_pinned(user) and replica_usable()
+    return routing.replica
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Read from the replica inside the block, outside a request.
+
+    Writes in the block switch it back to the primary, as in a request.
+    """
+    token = _routing.set(Routing(replica=enabled and replica_usable()))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def primary_reads_after(written_at):
+    """Read from the primary inside the block if the replica may still miss a
+    write made at ``written_at``, a UNIX timestamp."""
+    routing = _routing.get()
+    if (
+        routing is None
+        or not routing.replica
+        or time.time() - written_at > _pin_seconds()
+    ):
+        yield
+        return
+    routing.replica = False
+    try:
+        yield
+    finally:
+        routing.replica = not routing.wrote
+
+
+class ReplicaRouter:
+    """Send reads of requests that opted in to the replica, and writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return REPLICA if reads_from_replica() else None
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+            routing.replica = False
+        # Objects read from the replica are saved to the primary as well.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Give every request its own routing state, on the primary by default.
+
+    The state is not reset when the view returns, so a streamed response
+    keeps reading from the database its view chose. After a request that
+    wrote, its user is pinned to the primary.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = Routing()
+        _routing.set(routing)
+        response = self.get_response(request)
+        self.process_routing(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = Routing()
+        _routing.set(routing)
+        response = await self.get_response(request)
+        if routing.wrote:
+            await sync_to_async(self.process_routing)(request, routing)
+        return response
+
+    def process_routing(self, request, routing):
+        user = getattr(request, "user", None)
+        if routing.wrote and user is not None and user.is_authenticated:
+            pin_to_primary(user)
+
+
+class ReplicaReadMixin:
+    """Read from the replica in the view actions named in ``replica_actions``.
+
+    Actions are viewset actions such as ``list``, or handler methods such as
+    ``get`` for other views. The choice is made after authentication, so a
+    user who just wrote keeps reading from the primary.
+    """
+
+    replica_actions = ("list",)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, "action", None) or request.method.lower()
+        if action in self.replica_actions:
+            use_replica(request.user)
@@ -0,0 +1,38 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _parse_day(name, value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: "Expected a date in YYYY-MM-DD format."})
+    return day
+
+
+def created_between(params, field="created_at"):
+    """Return filter kwargs for the ``date_from``/``date_to`` query params.
+
+    Both bounds are whole days and inclusive, and are turned into a half-open
+    ``[date_from 00:00, date_to + 1 day 00:00)`` range on ``field``, so the
+    column is compared as-is and an index on it can be used. Raises
+    ``ValidationError`` when a bound is not a ``YYYY-MM-DD`` date.
+    """
+    lookups = {}
+    date_from = params.get("date_from")
+    date_to = params.get("date_to")
+    if date_from:
+        lookups[f"{field}__gte"] = day_start(_parse_day("date_from", date_from))
+    if date_to:
+        end = _parse_day("date_to", date_to) + timedelta(days=1)
+        lookups[f"{field}__lt"] = day_start(end)
+    return lookups
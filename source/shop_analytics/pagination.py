@@ -0,0 +1,158 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+from .search import SEARCH_RANK
+
+
+def _encode(value):
+    # Exact text forms; DjangoJSONEncoder would cut datetimes to milliseconds.
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(CursorPagination):
+    """Opaque-cursor pagination whose pages cost the same at any depth.
+
+    A cursor holds every ordering value of the row it points at, and the next
+    page seeks past that row on the whole ordering, which ends with the unique
+    ``id``. Rows sharing a ``created_at`` or a search rank are therefore never
+    skipped or repeated, and no offset is ever scanned.
+
+    ``?page_size=`` is honoured up to ``settings.API_MAX_PAGE_SIZE``. Results
+    of a full-text ``search`` are paged by ``search_rank`` first.
+    ``apaginate_queryset`` reads the page with the async ORM.
+    """
+
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = ("-id",)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if SEARCH_RANK in queryset.query.annotations:
+            return (f"-{SEARCH_RANK}", *ordering)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self._page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self._set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self._page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self._set_page([item async for item in page_queryset])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._position(self.page[-1])
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._position(self.page[0])
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if reverse:
+            queryset = queryset.order_by(*map(self._flip, self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            values = self._decode_position(queryset.model, self.cursor.position)
+            queryset = queryset.filter(self._seek(values, reverse))
+
+        # One extra row tells whether a following page exists.
+        return queryset[: self.page_size + 1]
+
+    def _set_page(self, results):
+        self.page = results[: self.page_size]
+        has_following = len(results) > len(self.page)
+        if self.cursor is not None and self.cursor.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _seek(self, values, reverse):
+        """Match the rows after ``values`` in the ordering, or before if ``reverse``.
+
+        ``(a, b) > (x, y)`` is spelled ``a > x OR (a = x AND b > y)`` so the
+        columns may be sorted in different directions. The extra bound on the
+        first column lets the index scan start at the cursor.
+        """
+        after, tied = Q(), Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") != reverse else "gt"
+            after |= tied & Q(**{f"{name}__{lookup}": value})
+            tied &= Q(**{name: value})
+
+        first = self.ordering[0]
+        lookup = "lte" if first.startswith("-") != reverse else "gte"
+        return Q(**{f"{first.lstrip('-')}__{lookup}": values[0]}) & after
+
+    def _position(self, instance):
+        values = [getattr(instance, field.lstrip("-")) for field in self.ordering]
+        return json.dumps([_encode(value) for value in values])
+
+    def _decode_position(self, model, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError(position)
+            return [
+                self._to_python(model, field.lstrip("-"), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message) from None
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation such as the search rank, kept as JSON decoded it.
+            return value
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError(name)
+        return value
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Upper
+from django.utils.text import smart_split, unescape_string_literal
+from rest_framework.exceptions import ValidationError
+
+SEARCH_MODES = ("contains", "substring", "fulltext")
+# Text search configuration of the full-text indexes. Names, companies and
+# descriptions are mixed-language, so words are indexed without stemming.
+SEARCH_CONFIG = "simple"
+SEARCH_RANK = "search_rank"
+
+
+def trigram_index(field, name):
+    """GIN trigram index serving ``field__icontains`` lookups.
+
+    On PostgreSQL ``icontains`` compiles to ``UPPER(field::text) LIKE
+    UPPER('%term%')``, so the index is built on the same ``UPPER`` expression.
+    Terms shorter than three characters have no trigrams and still scan.
+    """
+    return GinIndex(OpClass(Upper(field), name="gin_trgm_ops"), name=name)
+
+
+def search_vector(*fields):
+    return SearchVector(*fields, config=SEARCH_CONFIG)
+
+
+def full_text_index(fields, name):
+    """GIN index on the ``search_vector`` of ``fields``, used by ``fulltext`` mode."""
+    return GinIndex(search_vector(*fields), name=name)
+
+
+def contains_filter(model, fields, term):
+    """Return a ``Q`` matching rows where one of ``fields`` contains ``term``.
+
+    Fields on a related model, such as ``user__email``, are matched in a
+    subquery against that model instead of being ORed across a join, so
+    every table can use its own trigram indexes.
+    """
+    condition = Q()
+    related = defaultdict(list)
+    for field in fields:
+        relation, _, name = field.partition("__")
+        if name:
+            related[relation].append(name)
+        else:
+            condition |= Q(**{f"{field}__icontains": term})
+
+    for relation, names in related.items():
+        related_model = model._meta.get_field(relation).related_model
+        matches = related_model._default_manager.filter(
+            contains_filter(related_model, names, term)
+        )
+        condition |= Q(**{f"{relation}__in": matches.values("pk")})
+    return condition
+
+
+def search_terms(search_term):
+    """Split ``search_term`` into words the way the admin does, keeping quoted phrases."""
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            yield bit
+
+
+def search(queryset, fields, term, mode="contains"):
+    """Filter ``queryset`` to rows matching ``term`` in ``fields``.
+
+    ``contains`` keeps rows where every word of ``term`` is a substring of one
+    of ``fields``; ``substring`` keeps rows where one of ``fields`` contains
+    the whole ``term``, as a plain ``icontains`` filter does. ``fulltext`` matches ``term`` as a web-style query against
+    the ``search_vector`` of ``fields`` and annotates each row with its
+    ``search_rank``; ``KeysetPagination`` pages such results by relevance.
+    Raises ``ValidationError`` for an unknown ``mode``.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValidationError(
+            {"search_mode": f"Expected one of: {', '.join(SEARCH_MODES)}."}
+        )
+
+    if mode == "contains":
+        for word in search_terms(term):
+            queryset = queryset.filter(contains_filter(queryset.model, fields, word))
+        return queryset
+    if mode == "substring":
+        return queryset.filter(contains_filter(queryset.model, fields, term))
+
+    vector = search_vector(*fields)
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type="websearch")
+    return (
+        queryset.alias(search_document=vector)
+        .filter(search_document=query)
+        .annotate(**{SEARCH_RANK: Cast(SearchRank(vector, query), FloatField())})
+    )
+
+
+class SearchAdminMixin:
+    """Admin search through ``contains_filter``, backed by trigram indexes.
+
+    ``search_fields`` are plain field paths; lookups such as ``^name`` or
+    ``=id`` are not supported.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        return search(queryset, self.search_fields, search_term), False
@@ -10,11 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
-from datetime import timedelta
 
 load_dotenv()
 
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "dj_rest_auth",
@@ -57,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "shop_analytics.db_router.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -111,16 +114,97 @@ AUTH_USER_MODEL = "users.CustomUser"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# https://docs.djangoproject.com/en/5.2/ref/databases/#connection-pool
+# With DB_POOL=true every process keeps a psycopg 3 pool of
+# DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE open connections per database alias. The
+# processes are the gunicorn workers (WEB_CONCURRENCY), the report worker and
+# the REPORT_RENDER_PROCESSES of each ASGI worker, so up to
+# processes * DB_POOL_MAX_SIZE connections must fit in max_connections.
+# Behind an external pooler such as PgBouncer in transaction mode, set
+# DB_POOL=false and let the pooler multiplex the connections.
+# Unless DB_HEALTH_CHECKS=false, connections are checked before they are
+# handed out; they are replaced after DB_POOL_MAX_LIFETIME seconds. Without
+# the pool, DB_CONN_MAX_AGE keeps a connection per thread for that many
+# seconds (0 closes it after each request).
+
+DB_POOL = os.environ.get("DB_POOL", "True").lower() == "true"
+DB_HEALTH_CHECKS = os.environ.get("DB_HEALTH_CHECKS", "True").lower() == "true"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": os.environ.get("POSTGRES_DB"),
         "USER": os.environ.get("POSTGRES_USER"),
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": os.environ.get("POSTGRES_HOST"),
         "PORT": os.environ.get("POSTGRES_PORT"),
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": DB_HEALTH_CHECKS,
+        "OPTIONS": {},
+    }
+}
+
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "4")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "600")),
+        "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600")),
+    }
+
+# Report and list endpoints read from a replica when DB_REPLICA_HOST is set,
+# while it lags at most DB_REPLICA_MAX_LAG seconds; see shop_analytics/db_router.py.
+# For a local test, point it at a second PostgreSQL instance, or add a
+# "replica" alias to DATABASES in a settings module of your own, e.g. an
+# SQLite copy of the data. Users who wrote are pinned to the primary through
+# the DB_REPLICA_PIN_CACHE cache alias, which must be shared between workers;
+# `manage.py check` fails when it is a per-process cache.
+DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST")
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_PIN_CACHE = os.environ.get("DB_REPLICA_PIN_CACHE", "reports")
+
+if DB_REPLICA_HOST:
+    # Unset or empty values fall back to those of the primary.
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ.get("DB_REPLICA_NAME") or DATABASES["default"]["NAME"],
+        "USER": os.environ.get("DB_REPLICA_USER") or DATABASES["default"]["USER"],
+        "PASSWORD": os.environ.get("DB_REPLICA_PASSWORD")
+        or DATABASES["default"]["PASSWORD"],
+        "HOST": DB_REPLICA_HOST,
+        "PORT": os.environ.get("DB_REPLICA_PORT") or DATABASES["default"]["PORT"],
+        "OPTIONS": copy.deepcopy(DATABASES["default"]["OPTIONS"]),
+        "TEST": {"MIRROR": "default"},
     }
+
+DATABASE_ROUTERS = ["shop_analytics.db_router.ReplicaRouter"]
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The "reports" alias holds sales reports and the replica pins of users who
+# wrote (DB_REPLICA_PIN_CACHE).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Report results and data versions must be shared by every worker process
+    # and container, so they default to files under media/, which all of them
+    # mount. Use Redis or Memcached when the web servers run on several hosts.
+    "reports": {
+        "BACKEND": os.environ.get(
+            "REPORT_CACHE_BACKEND",
+            "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.environ.get(
+            "REPORT_CACHE_LOCATION", str(BASE_DIR / "media" / "cache" / "reports")
+        ),
+        "TIMEOUT": int(os.environ.get("REPORT_CACHE_TIMEOUT", "3600")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("REPORT_CACHE_MAX_ENTRIES", "10000")),
+        },
+    },
 }
 
 
@@ -177,6 +261,9 @@ STATICFILES_DIRS = [
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATIC_URL = "static/"
 
+MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_URL = "media/"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -191,6 +278,41 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
 }
+# List endpoints page with shop_analytics.pagination.KeysetPagination.
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", "50"))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", "500"))
+# Largest chunk_size accepted by the NDJSON order import endpoint; a chunk is
+# validated and inserted in one transaction.
+IMPORT_MAX_CHUNK_SIZE = int(os.environ.get("IMPORT_MAX_CHUNK_SIZE", "5000"))
+
+# Asynchronous PDF reports, rendered by `manage.py report_worker`.
+REPORT_WORKER_CONCURRENCY = int(os.environ.get("REPORT_WORKER_CONCURRENCY", "2"))
+REPORT_WORKER_POLL_INTERVAL = float(os.environ.get("REPORT_WORKER_POLL_INTERVAL", "2"))
+REPORT_JOB_TIMEOUT = int(os.environ.get("REPORT_JOB_TIMEOUT", "300"))
+REPORT_JOB_MAX_ATTEMPTS = int(os.environ.get("REPORT_JOB_MAX_ATTEMPTS", "3"))
+# Reports a worker process renders before it is replaced, which caps the
+# memory a long-running process can accumulate.
+REPORT_WORKER_MAX_TASKS_PER_CHILD = int(
+    os.environ.get("REPORT_WORKER_MAX_TASKS_PER_CHILD", "50")
+)
+
+# Reports show at most REPORT_DETAIL_ROW_LIMIT orders inline. Chunked PDFs lay
+# the full table out REPORT_PDF_CHUNK_ROWS rows at a time, up to
+# REPORT_PDF_MAX_ROWS orders; bigger periods should use the CSV/XLSX export.
+REPORT_DETAIL_ROW_LIMIT = int(os.environ.get("REPORT_DETAIL_ROW_LIMIT", "100"))
+REPORT_PDF_CHUNK_ROWS = int(os.environ.get("REPORT_PDF_CHUNK_ROWS", "1000"))
+REPORT_PDF_MAX_ROWS = int(os.environ.get("REPORT_PDF_MAX_ROWS", "100000"))
+# Processes rendering PDFs for requests served over ASGI; 0 renders them in
+# a worker thread of the server process instead.
+REPORT_RENDER_PROCESSES = int(os.environ.get("REPORT_RENDER_PROCESSES", "2"))
+
+# Rendered PDFs are cached on disk by content hash; 0 disables the cache.
+REPORT_PDF_CACHE_DIR = os.environ.get(
+    "REPORT_PDF_CACHE_DIR", str(MEDIA_ROOT / "report-cache")
+)
+REPORT_PDF_CACHE_MAX_BYTES = int(
+    os.environ.get("REPORT_PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
 
 
 REST_AUTH = {
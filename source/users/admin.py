@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from shop_analytics.search import SearchAdminMixin
 from .models import CustomUser, ClientDiscount
 
 
@@ -10,7 +11,7 @@ class ClientDiscountInline(admin.StackedInline):
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(SearchAdminMixin, UserAdmin):
     inlines = (ClientDiscountInline,)
 
     list_display = ("email", "full_name", "company_name", "is_staff", "is_active")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0004_clientdiscount"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(fields=["created_at", "id"], name="user_created_id_idx"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0005_customuser_user_created_id_idx"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=models.Index(
+                fields=["is_active", "created_at"], name="user_active_created_idx"
+            ),
+        ),
+    ]
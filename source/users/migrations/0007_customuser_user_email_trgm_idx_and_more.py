@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:49
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0006_customuser_user_active_created_idx"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=GinIndex(
+                OpClass(Upper("email"), name="gin_trgm_ops"),
+                name="user_email_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=GinIndex(
+                OpClass(Upper("full_name"), name="gin_trgm_ops"),
+                name="user_full_name_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=GinIndex(
+                OpClass(Upper("company_name"), name="gin_trgm_ops"),
+                name="user_company_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=GinIndex(
+                SearchVector("company_name", config="simple"),
+                name="user_company_search_idx",
+            ),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager, AbstractBaseUser
 from django.db import models
 from django.contrib.auth.models import PermissionsMixin
+from shop_analytics.search import full_text_index, trigram_index
 
 
 class CustomUserManager(BaseUserManager):
@@ -45,6 +46,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         app_label = "users"
+        indexes = (
+            models.Index(fields=["created_at", "id"], name="user_created_id_idx"),
+            models.Index(
+                fields=["is_active", "created_at"], name="user_active_created_idx"
+            ),
+            trigram_index("email", "user_email_trgm_idx"),
+            trigram_index("full_name", "user_full_name_trgm_idx"),
+            trigram_index("company_name", "user_company_trgm_idx"),
+            full_text_index(["company_name"], "user_company_search_idx"),
+        )
 
 
 class ClientDiscount(models.Model):
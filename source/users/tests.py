@@ -1,3 +1,123 @@
-from django.test import TestCase
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from shop_analytics.search import SEARCH_RANK, search, trigram_index
+
+from .admin import CustomUserAdmin
+from .models import CustomUser
+
+
+class SearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(
+            "staff@example.com", "Staff", "password", is_staff=True
+        )
+        for email, company in (
+            ("acme@example.com", "Big Acme Ltd"),
+            ("ltd@example.com", "Ltd of Acme"),
+            ("globex@example.com", "Globex"),
+        ):
+            CustomUser.objects.create_user(
+                email, email.split("@")[0].title(), "password", company_name=company
+            )
+
+    def companies(self, queryset):
+        return sorted(queryset.values_list("company_name", flat=True))
+
+
+class SearchModeTests(SearchTestCase):
+    def test_substring_matches_the_whole_term(self):
+        queryset = search(
+            CustomUser.objects.all(), ["company_name"], "acme ltd", "substring"
+        )
+
+        self.assertEqual(self.companies(queryset), ["Big Acme Ltd"])
+
+    def test_contains_matches_every_word_anywhere(self):
+        queryset = search(
+            CustomUser.objects.all(), ["company_name"], "ltd acme", "contains"
+        )
+
+        self.assertEqual(self.companies(queryset), ["Big Acme Ltd", "Ltd of Acme"])
+
+    def test_contains_keeps_quoted_phrases_together(self):
+        queryset = search(
+            CustomUser.objects.all(), ["email", "company_name"], '"of acme"', "contains"
+        )
+
+        self.assertEqual(self.companies(queryset), ["Ltd of Acme"])
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL.")
+    def test_fulltext_matches_words_and_annotates_the_rank(self):
+        queryset = search(
+            CustomUser.objects.all(), ["company_name"], "acme -big", "fulltext"
+        )
+
+        self.assertEqual(self.companies(queryset), ["Ltd of Acme"])
+        self.assertGreater(getattr(queryset.get(), SEARCH_RANK), 0)
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            search(CustomUser.objects.all(), ["company_name"], "acme", "fuzzy")
+
+    @skipUnless(connection.vendor == "postgresql", "Trigram indexes need PostgreSQL.")
+    def test_trigram_index_covers_the_icontains_expression(self):
+        index = trigram_index("company_name", "company_trgm_idx")
+        lookup = str(CustomUser.objects.filter(company_name__icontains="x").query)
+
+        with connection.schema_editor() as editor:
+            statement = str(index.create_sql(CustomUser, editor))
+
+        self.assertIn('UPPER("users_customuser"."company_name"::text)', lookup)
+        self.assertIn('UPPER("company_name")', statement)
+        self.assertIn("gin_trgm_ops", statement)
+
+
+class CustomerSearchTests(SearchTestCase):
+    client_class = APIClient
+    url = "/api/users/customers/"
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+
+    def customers(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(row["company_name"] for row in response.json()["results"])
+
+    def test_company_name_matches_a_substring_by_default(self):
+        self.assertEqual(self.customers(company_name="ACME LTD"), ["Big Acme Ltd"])
+        self.assertEqual(
+            self.customers(company_name="acme ltd", search_mode="contains"),
+            ["Big Acme Ltd", "Ltd of Acme"],
+        )
+
+    def test_unknown_search_mode_is_a_bad_request(self):
+        response = self.client.get(
+            self.url, {"company_name": "acme", "search_mode": "fuzzy"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CustomUserAdminSearchTests(SearchTestCase):
+    def test_every_word_matches_one_of_the_search_fields(self):
+        model_admin = CustomUserAdmin(CustomUser, AdminSite())
+        request = RequestFactory().get("/admin/users/customuser/")
+
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            request, CustomUser.objects.all(), "acme globex"
+        )
+        self.assertEqual(self.companies(queryset), [])
+        self.assertFalse(may_have_duplicates)
+
+        queryset, _ = model_admin.get_search_results(
+            request, CustomUser.objects.all(), "ltd example.com"
+        )
+        self.assertEqual(self.companies(queryset), ["Big Acme Ltd", "Ltd of Acme"])
@@ -9,15 +9,21 @@ from rest_framework.response import Response
 from dj_rest_auth.app_settings import api_settings as dj_rest_auth_app_settings
 from dj_rest_auth.jwt_auth import set_jwt_access_cookie, set_jwt_refresh_cookie
 from rest_framework import status
+from shop_analytics.db_router import ReplicaReadMixin
+from shop_analytics.filters import created_between
+from shop_analytics.pagination import CreatedAtKeysetPagination
+from shop_analytics.search import SEARCH_MODES, search
 
 
 User = get_user_model()
 
 
-class CustomerListCreateView(generics.ListCreateAPIView):
+class CustomerListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = CreatedAtKeysetPagination
+    replica_actions = ("get",)
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -27,6 +33,16 @@ class CustomerListCreateView(generics.ListCreateAPIView):
                 description="Фильтр по части названия компании (без учета регистра).",
                 type=openapi.TYPE_STRING,
             ),
+            openapi.Parameter(
+                "search_mode",
+                openapi.IN_QUERY,
+                description="Режим поиска по названию компании: 'substring' — "
+                "по подстроке целиком (по умолчанию), 'contains' — каждое слово "
+                "по подстроке, 'fulltext' — полнотекстовый, результаты "
+                "упорядочены по релевантности.",
+                type=openapi.TYPE_STRING,
+                enum=list(SEARCH_MODES),
+            ),
             openapi.Parameter(
                 "status",
                 openapi.IN_QUERY,
@@ -56,21 +72,16 @@ class CustomerListCreateView(generics.ListCreateAPIView):
         queryset = CustomUser.objects.all()
         company = self.request.GET.get("company_name")
         status = self.request.GET.get("status")
-        date_from = self.request.GET.get("date_from")
-        date_to = self.request.GET.get("date_to")
 
         if company:
-            queryset = queryset.filter(company_name__icontains=company)
+            search_mode = self.request.GET.get("search_mode", "substring")
+            queryset = search(queryset, ["company_name"], company, search_mode)
 
         if status is not None:
             is_active_status = status.lower() == "true"
             queryset = queryset.filter(is_active=is_active_status)
 
-        if date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-
-        if date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
+        queryset = queryset.filter(**created_between(self.request.GET))
 
         return queryset.order_by("-created_at")
 